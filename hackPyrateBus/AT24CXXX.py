@@ -1,9 +1,12 @@
 from vendor.pyBusPirateLite.I2C import I2C
+from vendor.pyBusPirateLite.base import ProtocolError, instrumented
+import time
 
 class AT24CXXX(I2C):
     """ Adapted I2C methods for AT24128/256 EEPROMs """
 
     PAGE_SIZE = 64 # page size in bytes
+    WRITE_CYCLE_TIME = 0.005 # maximum self-timed write cycle (tWR) in s
     MAX_WORDS = {
         128: 16384,
         256: 32768,
@@ -43,22 +46,31 @@ class AT24CXXX(I2C):
         self.i2c_speed = None
         self.size = size
         self.device_address = device_address << 1
+        self.write_cycle_stats = {}
+        self._writing = False
+        self._write_since = 0.0
 
+    @instrumented('AT24CXXX.store')
     def store(self, addr, data):
         """
-        Store data to EEPROM using the write_then_read method
+        Store data to EEPROM using the write_then_read method. Every page write
+        is given the time it needs to complete (see wait_write_cycle) before
+        the next one.
 
         Parameters
         ----------
         addr : int
             Two byte address in the EEPROM
-        data : bytes
-            The bytes to write to the EEPROM
+        data : bytes-like
+            The bytes to write to the EEPROM, any buffer (bytes, memoryview,
+            mmap...) is sliced in place without copying it
 
         Raises
         ------
         ValueError
             If the address is out of range for the EEPROM size
+        ProtocolError
+            If the EEPROM does not complete the write cycle
 
         Examples
         --------
@@ -66,16 +78,92 @@ class AT24CXXX(I2C):
         >>> at24c.store(0x0000, b'\x00Hello, world!\xff')
         """
 
-        if addr + len(data) > self.MAX_WORDS[self.size]:
-            raise ValueError("Out of range for EEPROM")
+        with memoryview(data).cast('B') as data:
+            if addr + len(data) > self.MAX_WORDS[self.size]:
+                raise ValueError("Out of range for EEPROM")
+
+            # split the data into PAGE_SIZE byte chunks otherwise the same page is overwritten over and over
+            # check the datasheet for the page size 'WRITE OPERATIONS - PAGE WRITE' section
+            i = 0
+            while i < len(data):
+                # the EEPROM does not accept commands during the write cycle
+                self.wait_write_cycle()
+
+                # ensure we do not overwrite the page boundary
+                length = min(len(data) - i, self.PAGE_SIZE - addr % self.PAGE_SIZE)
+                page = self.frame(self.device_address, addr.to_bytes(2, 'big'), data[i:i + length])
+                self.write_then_read(len(page), 0, page)
+                self._writing = True
+                self._write_since = time.monotonic()
+                addr += length
+                i += length
+
+            self.wait_write_cycle()
+
+    @instrumented('AT24CXXX.wait_write_cycle')
+    def wait_write_cycle(self, timeout=None):
+        """
+        Wait for the self-timed write cycle of the last page write to complete
+        using ACK polling: the device address is sent until the EEPROM ACKs it
+        again. The first poll is delayed to the fastest write cycle observed so
+        far, capped to the datasheet write cycle time, and the timings are
+        recorded in write_cycle_stats.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time to wait in seconds, by default twice the datasheet
+            maximum write cycle time
 
-        # split the data into PAGE_SIZE byte chunks otherwise the same page is overwritten over and over
-        # check the datasheet for the page size 'WRITE OPERATIONS - PAGE WRITE' section
-        for i in range(0, len(data), self.PAGE_SIZE):
-            header = [self.device_address] + list(addr.to_bytes(2, 'big'))
-            r = self.write_then_read(len(header) + len(data[i:i + self.PAGE_SIZE]), 0, header + list(data[i:i + self.PAGE_SIZE]))
-            addr += self.PAGE_SIZE
+        Raises
+        ------
+        ProtocolError
+            If the EEPROM does not ACK before the timeout
+
+        Examples
+        --------
+        >>> at24c.store(0x0000, b'\x00Hello, world!\xff')
+        >>> at24c.write_cycle_stats
+        {'count': 1, 'total': 0.0031, 'min': 0.0031, 'max': 0.0031, 'polls': 2}
+        """
 
+        if not self._writing:
+            return
+        if timeout is None:
+            timeout = self.WRITE_CYCLE_TIME * 2
+
+        stats = self.write_cycle_stats
+        if stats:
+            expected = min(stats['min'] * 0.9, self.WRITE_CYCLE_TIME)
+            delay = self._write_since + expected - time.monotonic()
+            if delay > 0:
+                self.timeout(delay)
+
+        polls = 0
+        while True:
+            sent = time.monotonic()
+            polls += 1
+            try:
+                # the EEPROM does not ACK its address until the write cycle ends
+                self.write_then_read(1, 0, [self.device_address])
+                break
+            except ProtocolError:
+                if sent - self._write_since > timeout:
+                    raise ProtocolError("EEPROM write cycle timed out")
+
+        self._writing = False
+        # the write cycle ended before the last poll was sent, the time spent
+        # waiting for its reply is link latency
+        elapsed = sent - self._write_since
+        if not stats:
+            stats.update({'count': 0, 'total': 0.0, 'min': elapsed, 'max': elapsed, 'polls': 0})
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['min'] = min(stats['min'], elapsed)
+        stats['max'] = max(stats['max'], elapsed)
+        stats['polls'] += polls
+
+    @instrumented('AT24CXXX.load')
     def load(self, addr, amount):
         """
         Load data from EEPROM using the write_then_read method
@@ -91,6 +179,8 @@ class AT24CXXX(I2C):
         ------
         ValueError
             If the address is out of range for the EEPROM size
+        ProtocolError
+            If a reply is incomplete
 
         Examples
         --------
@@ -98,25 +188,62 @@ class AT24CXXX(I2C):
         >>> at24c.load(0x0000, 15)
         """
 
-        if addr + amount > self.MAX_WORDS[self.size]:
-            raise ValueError("Out of range for EEPROM")
+        buffer = bytearray(amount)
+        self.load_into(addr, buffer)
+
+        return bytes(buffer)
+
+    @instrumented('AT24CXXX.load_into')
+    def load_into(self, addr, buffer):
+        """
+        Load data from EEPROM straight into a writable buffer, such as a
+        bytearray or a memory-mapped file, filling it entirely
+
+        Parameters
+        ----------
+        addr : int
+            Two byte address in the EEPROM
+        buffer : bytearray or memoryview or mmap
+            Writable buffer, as many bytes as it can hold are read
+
+        Returns
+        -------
+        int
+            The number of bytes read
+
+        Raises
+        ------
+        ValueError
+            If the address is out of range for the EEPROM size
+        ProtocolError
+            If a reply is incomplete
+
+        Examples
+        --------
+        >>> eeprom = bytearray(at24c.MAX_WORDS[at24c.size])
+        >>> at24c.load_into(0x0000, eeprom)
+        """
+
+        with memoryview(buffer).cast('B') as view:
+            amount = len(view)
+            if addr + amount > self.MAX_WORDS[self.size]:
+                raise ValueError("Out of range for EEPROM")
+
+            self.wait_write_cycle()
 
-        # dummy write to set the address pointer
-        header = [self.device_address] + list(addr.to_bytes(2, 'big'))
-        self.write_then_read(3, 0, header)
+            # dummy write to set the address pointer
+            header = self.device_address.to_bytes(1, 'big') + addr.to_bytes(2, 'big')
+            self.write_then_read(3, 0, header)
 
-        device_address = [self.device_address | 1]
-        res = []
-        # the bus pirate write_then_read method can only read 4096 bytes at a time
-        while amount > 4096:
-            # use sequential read mode
-            r = self.write_then_read(1, 4096, device_address)
-            res.extend(r)
-            amount -= 4096
-            addr += 4096
+            device_address = [self.device_address | 1]
+            received = 0
+            # the bus pirate write_then_read method can only read 4096 bytes at a time
+            for offset in range(0, amount, 4096):
+                length = min(4096, amount - offset)
+                # use sequential read mode
+                received += self.write_then_read(1, length, device_address, view[offset:offset + length])
 
-        # use sequential read mode
-        r = self.write_then_read(1, amount, device_address)
-        res.extend(r)
+        if received != amount:
+            raise ProtocolError("Timeout reading data")
 
-        return bytes(res)
+        return amount
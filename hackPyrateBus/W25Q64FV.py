@@ -1,12 +1,17 @@
 from vendor.pyBusPirateLite.SPI import SPI
-from vendor.pyBusPirateLite.base import ProtocolError
+from vendor.pyBusPirateLite.base import ProtocolError, instrumented
+from collections import deque
 import binascii
+import time
 
 class W25Q64FV(SPI):
     """ Adapted SPI methods for Winbond W25Q64FV flash memory"""
 
     PAGE_SIZE = 256 # page size in bytes
+    BLANK_PAGE = b'\xff' * PAGE_SIZE # contents of an erased page
+    SECTOR_SIZE = 4096 # smallest erasable unit in bytes
     MAX_WORDS = PAGE_SIZE * 32768 # max number of words in flash memory
+    READ_CHUNK = 4096 # maximum bytes returned by a single write_then_read
 
     COMMAND_READ = 0x03
     COMMAND_READ_STATUS_REG_1 = 0x05
@@ -21,6 +26,34 @@ class W25Q64FV(SPI):
     COMMAND_JEDEC_ID = 0x9F
     COMMAND_PAGE_PROGRAM = 0x02
 
+    # bytes erased by each erase command, largest first
+    ERASE_SIZES = {
+        COMMAND_ERASE_64KB: 65536,
+        COMMAND_ERASE_32KB: 32768,
+        COMMAND_ERASE_SECTOR: 4096,
+    }
+    # typical and maximum erase times in seconds, see the datasheet 'AC
+    # Electrical Characteristics' section (tSE, tBE1, tBE2, tCE)
+    ERASE_TIMES = {
+        COMMAND_ERASE_SECTOR: (0.045, 0.4),
+        COMMAND_ERASE_32KB: (0.12, 1.6),
+        COMMAND_ERASE_64KB: (0.15, 2.0),
+        COMMAND_ERASE_CHIP: (20.0, 100.0),
+    }
+    # typical and maximum busy times in seconds of every operation that sets
+    # the BUSY bit (tPP plus the erase times), used to tune the polling
+    BUSY_TIMES = {
+        COMMAND_PAGE_PROGRAM: (0.0007, 0.003),
+        **ERASE_TIMES,
+    }
+    BUSY_OPERATIONS = {
+        COMMAND_PAGE_PROGRAM: 'page_program',
+        COMMAND_ERASE_SECTOR: 'sector_erase',
+        COMMAND_ERASE_32KB: 'block_erase_32kb',
+        COMMAND_ERASE_64KB: 'block_erase_64kb',
+        COMMAND_ERASE_CHIP: 'chip_erase',
+    }
+
     def __init__(self, portname='', speed=115200, timeout=0.5, connect=True, buzzpirateFirm=True):
         """
         Provide high-speed access to the Bus Pirate SPI hardware.
@@ -59,10 +92,15 @@ class W25Q64FV(SPI):
         self._speed = None
         self._cs = None
         self._pins = None
+        self.iosuccess = buzzpirateFirm
+        self.busy_stats = {}
+        self._busy_command = None
+        self._busy_since = 0.0
 
         if not buzzpirateFirm:
             self.write_then_read = self.write_then_read_no_iosuccess
 
+    @instrumented('W25Q64FV.read')
     def read(self, addr, amount):
         """
         Read data from flash memory using the write_then_read method. Currently
@@ -70,6 +108,8 @@ class W25Q64FV(SPI):
         pulling the CS pin high (even though in the documentation it says the CS
         pin is pulled high before sending the data).
 
+        The data is streamed chunk by chunk (see iter_read).
+
         Parameters
         ----------
         addr : int
@@ -82,7 +122,7 @@ class W25Q64FV(SPI):
         ValueError
             If the address is out of range for the flash memory size
         ProtocolError
-            If the flash memory is busy
+            If the flash memory stays busy
 
         Examples
         --------
@@ -91,74 +131,313 @@ class W25Q64FV(SPI):
         ...     f.write(img)
         """
 
+        return b''.join(self.iter_read(addr, amount))
+
+    def iter_read(self, addr, amount, chunk_size=READ_CHUNK, depth=1):
+        """
+        Read data from flash memory as a stream of chunks.
+
+        With a depth greater than 1, up to `depth` read commands are kept
+        queued on the serial link, so the Bus Pirate can start the next read as
+        soon as it has returned the previous one instead of waiting for a full
+        round trip. Pipelining is opt-in and not validated on hardware yet: the
+        next command is sent while the Bus Pirate is still returning a reply,
+        and the BPv3 UART has a 4 byte receive FIFO that may overflow. If the
+        generator is closed early the replies still in flight are drained,
+        leaving the Bus Pirate in a clean state.
+
+        Parameters
+        ----------
+        addr : int
+            Three byte address in the flash memory
+        amount : int
+            The number of bytes to read from the flash memory
+        chunk_size : int
+            Bytes per read command, at most 4096 (Bus Pirate buffer size)
+        depth : int
+            Number of read commands in flight, 1 (default) disables
+            pipelining
+
+        Yields
+        ------
+        bytes
+            Consecutive chunks of at most chunk_size bytes
+
+        Raises
+        ------
+        ValueError
+            If the address is out of range for the flash memory size or the
+            chunk size is not supported
+        ProtocolError
+            If the flash memory stays busy
+
+        Examples
+        --------
+        >>> for chunk in winbond.iter_read(0x000000, 0x10000):
+        ...     print(len(chunk))
+        """
+
         if addr + amount > self.MAX_WORDS:
             raise ValueError("Out of range for flash memory size")
+        if not 0 < chunk_size <= self.READ_CHUNK:
+            raise ValueError("Chunk size must be between 1 and %d bytes" % self.READ_CHUNK)
+
+        ranges = ((chunk_addr, min(chunk_size, addr + amount - chunk_addr))
+                  for chunk_addr in range(addr, addr + amount, chunk_size))
+        return self.iter_read_ranges(ranges, depth)
 
-        # check that the flash memory is not busy
-        if self.status_registers()[0] & 0x01:
-            raise ProtocolError("Flash memory is busy")
+    def iter_read_ranges(self, ranges, depth=1):
+        """
+        Read a sequence of arbitrary ranges of the flash memory, optionally
+        pipelining the read commands as iter_read does. Useful to read
+        scattered samples or sectors as a single stream.
 
-        res = []
-        # the bus pirate write_then_read method can only read 4096 bytes at a time
-        while amount > 4096:
-            header = [self.COMMAND_READ] + list(addr.to_bytes(3, 'big'))
-            r = self.write_then_read(len(header), 4096, header)
-            res.extend(r)
-            amount -= 4096
-            addr += 4096
+        Parameters
+        ----------
+        ranges : iterable
+            (addr, length) tuples, length at most 4096 (Bus Pirate buffer size)
+        depth : int
+            Number of read commands in flight, 1 (default) disables
+            pipelining
 
-        header = [self.COMMAND_READ] + list(addr.to_bytes(3, 'big'))
-        r = self.write_then_read(len(header), amount, header)
-        res.extend(r)
+        Yields
+        ------
+        bytes
+            The contents of every range, in order
 
-        return bytes(res)
+        Raises
+        ------
+        ValueError
+            If a range is out of range for the flash memory size or too long
+        ProtocolError
+            If the flash memory stays busy
 
-    def store(self, addr, data):
+        Examples
+        --------
+        >>> for sample in winbond.iter_read_ranges([(0x000000, 16), (0x001000, 16)]):
+        ...     print(sample.hex())
         """
-        Store data to flash memory. The data is split into PAGE_SIZE byte chunks
-        and the method takes care of Write Enable.
+
+        self.wait_ready()
+
+        pending = deque()
+        try:
+            for addr, length in ranges:
+                if addr < 0 or addr + length > self.MAX_WORDS:
+                    raise ValueError("Out of range for flash memory size")
+                if not 0 < length <= self.READ_CHUNK:
+                    raise ValueError("Chunk size must be between 1 and %d bytes" % self.READ_CHUNK)
+                header = self.COMMAND_READ.to_bytes(1, 'big') + addr.to_bytes(3, 'big')
+                self.write_then_read_request(len(header), length, header)
+                pending.append(length)
+                if len(pending) >= depth:
+                    yield self.write_then_read_response(pending.popleft(), self.iosuccess)
+
+            while pending:
+                yield self.write_then_read_response(pending.popleft(), self.iosuccess)
+        except (GeneratorExit, ValueError):
+            # do not leave unread replies in the serial buffer
+            while pending:
+                self.write_then_read_response(pending.popleft(), self.iosuccess)
+            raise
+
+    @instrumented('W25Q64FV.read_into')
+    def read_into(self, addr, buffer, chunk_size=READ_CHUNK, depth=1):
+        """
+        Read data from flash memory straight into a writable buffer, such as a
+        bytearray or a memory-mapped file, filling it entirely. The replies are
+        read in place, chunk by chunk, so no intermediate bytes objects are
+        allocated. The read commands can be pipelined as in iter_read.
 
         Parameters
         ----------
         addr : int
             Three byte address in the flash memory
-        data : bytes
-            The bytes to write to the flash memory
+        buffer : bytearray or memoryview or mmap
+            Writable buffer, as many bytes as it can hold are read
+        chunk_size : int
+            Bytes per read command, at most 4096 (Bus Pirate buffer size)
+        depth : int
+            Number of read commands in flight, 1 (default) disables
+            pipelining
+
+        Returns
+        ----------
+        int
+            The number of bytes read
 
         Raises
         ------
         ValueError
-            If the address is out of range for the flash memory size
+            If the address is out of range for the flash memory size or the
+            chunk size is not supported
+        ProtocolError
+            If the flash memory stays busy or a reply is incomplete
 
         Examples
         --------
-        >>> with open('flash.img', 'rb') as f:
-        ...     winbond.store(0x000000, file.read())
+        >>> import mmap
+        >>> with open('flash.img', 'w+b') as f:
+        ...     f.truncate(winbond.MAX_WORDS)
+        ...     with mmap.mmap(f.fileno(), 0) as img:
+        ...         winbond.read_into(0x000000, img)
         """
 
-        if addr + len(data) > self.MAX_WORDS:
+        view = memoryview(buffer).cast('B')
+        amount = len(view)
+        if addr + amount > self.MAX_WORDS:
             raise ValueError("Out of range for flash memory size")
+        if not 0 < chunk_size <= self.READ_CHUNK:
+            raise ValueError("Chunk size must be between 1 and %d bytes" % self.READ_CHUNK)
+
+        self.wait_ready()
+
+        pending = deque()
+        received = 0
+        try:
+            for offset in range(0, amount, chunk_size):
+                length = min(chunk_size, amount - offset)
+                header = self.COMMAND_READ.to_bytes(1, 'big') + (addr + offset).to_bytes(3, 'big')
+                self.write_then_read_request(len(header), length, header)
+                pending.append((offset, length))
+                if len(pending) >= depth:
+                    offset, length = pending.popleft()
+                    received += self.write_then_read_response(length, self.iosuccess, view[offset:offset + length])
+
+            while pending:
+                offset, length = pending.popleft()
+                received += self.write_then_read_response(length, self.iosuccess, view[offset:offset + length])
+        finally:
+            # let the caller close its mmap even if the read failed
+            view.release()
+
+        if received != amount:
+            raise ProtocolError("Timeout reading data")
+
+        return amount
+
+    @instrumented('W25Q64FV.dump')
+    def dump(self, fileobj, addr=0x000000, amount=None, chunk_size=READ_CHUNK, depth=1):
+        """
+        Stream the flash memory contents to a file object. Each chunk is written
+        as soon as it arrives, so memory usage does not depend on the amount
+        of data dumped.
+
+        Parameters
+        ----------
+        fileobj : file object
+            Binary file object the data is written to
+        addr : int
+            Three byte address in the flash memory
+        amount : int
+            The number of bytes to read, by default up to the end of the flash
+        chunk_size : int
+            Bytes per read command, at most 4096
+        depth : int
+            Number of read commands in flight (see iter_read)
+
+        Returns
+        ----------
+        int
+            The number of bytes written
+
+        Examples
+        --------
+        >>> with open('flash.img', 'wb') as f:
+        ...     winbond.dump(f)
+        """
 
-        # check that the flash memory is not busy
-        reg = self.status_registers()
-        if reg[0] & 0x01:
-            raise ProtocolError("Flash memory is busy")
+        if amount is None:
+            amount = self.MAX_WORDS - addr
 
-        # the page size is 256 bytes, so we need to write in chunks of 256 bytes
-        data_array = bytearray(data)
-        while len(data_array) > 0:
-            # enable write
-            if reg[0] & 0x02 == 0:
-                self.write_enable()
+        written = 0
+        for chunk in self.iter_read(addr, amount, chunk_size, depth):
+            fileobj.write(chunk)
+            written += len(chunk)
 
-            # ensure we do not overwrite the page boundary
-            page_slot = self.PAGE_SIZE - (addr & 0xFF)
-            length = min(len(data_array), page_slot)
+        return written
 
-            header = [self.COMMAND_PAGE_PROGRAM] + list(addr.to_bytes(3, 'big'))
-            self.write_then_read(len(header) + length, 0, header + list(data_array[:length]))
-            del data_array[:length]
-            addr += length
+    @instrumented('W25Q64FV.store')
+    def store(self, addr, data, combine=False):
+        """
+        Store data to flash memory. The data is split into PAGE_SIZE byte chunks
+        and the method takes care of Write Enable. Every page program is given
+        the time it needs to complete (see wait_ready) before the next one.
+
+        Parameters
+        ----------
+        addr : int
+            Three byte address in the flash memory
+        data : bytes-like
+            The bytes to write to the flash memory, any buffer (bytes,
+            memoryview, mmap...) is sliced in place without copying it
+        combine : bool
+            Send the Write Enable and Page Program commands of every page in a
+            single write, saving a round trip per page. Opt-in and not
+            validated on hardware yet: the Page Program bytes arrive while the
+            Bus Pirate is still running the Write Enable, and the BPv3 UART has
+            a 4 byte receive FIFO that may overflow
+
+        Raises
+        ------
+        ValueError
+            If the address is out of range for the flash memory size
+        ProtocolError
+            If the flash memory stays busy
+
+        Examples
+        --------
+        >>> with open('flash.img', 'rb') as f:
+        ...     winbond.store(0x000000, f.read())
+        >>> import mmap
+        >>> with open('flash.img', 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as img:
+        ...     winbond.store(0x000000, img)
+        """
+
+        with memoryview(data).cast('B') as data:
+            if addr + len(data) > self.MAX_WORDS:
+                raise ValueError("Out of range for flash memory size")
+
+            # the WEL bit is cleared after every page program, a write enable
+            # precedes every page. The frame of a full page is reused, only
+            # its address and data change
+            write_enable = self.write_then_read_frame(1, 0, [self.COMMAND_WRITE_ENABLE])
+            page_frame = self.write_then_read_frame(4 + self.PAGE_SIZE, 0, bytes(4 + self.PAGE_SIZE))
+            if combine:
+                page_frame = write_enable + page_frame
+            header = len(page_frame) - self.PAGE_SIZE - 4
+            page_frame[header] = self.COMMAND_PAGE_PROGRAM
+
+            # the page size is 256 bytes, so we need to write in chunks of 256 bytes
+            i = 0
+            while i < len(data):
+                # wait for the previous page program (or erase) to complete
+                self.wait_ready()
+
+                if not combine:
+                    self.write(write_enable)
+                    self.write_then_read_response(0, self.iosuccess)
+
+                # ensure we do not overwrite the page boundary
+                length = min(len(data) - i, self.PAGE_SIZE - (addr & 0xFF))
+                if length == self.PAGE_SIZE:
+                    page_frame[header + 1:header + 4] = addr.to_bytes(3, 'big')
+                    page_frame[header + 4:] = data[i:i + length]
+                    frame = page_frame
+                else:
+                    frame = self.write_then_read_frame(
+                        4 + length, 0, self.frame(self.COMMAND_PAGE_PROGRAM, addr.to_bytes(3, 'big'), data[i:i + length]))
+                    if combine:
+                        frame = write_enable + frame
+                self.write(frame)
+                if combine:
+                    self.write_then_read_response(0, self.iosuccess)
+                self.write_then_read_response(0, self.iosuccess)
+                self._busy(self.COMMAND_PAGE_PROGRAM)
+                addr += length
+                i += length
+
+            self.wait_ready()
 
     def calculate_pages(self, addr, data):
         """
@@ -202,10 +481,12 @@ class W25Q64FV(SPI):
 
         return pages
 
+    @instrumented('W25Q64FV.erase')
     def erase(self, command, addr):
         """
         Erase the flash memory using the provided command. It takes care of the
-        Write Enable.
+        Write Enable. The method returns as soon as the erase is started, use
+        wait_ready to wait for it to complete.
 
         Parameters
         ----------
@@ -220,7 +501,7 @@ class W25Q64FV(SPI):
         ValueError
             If the address is out of range for the flash memory size
         ProtocolError
-            If the flash memory is busy
+            If the flash memory stays busy
 
         Examples
         --------
@@ -230,19 +511,335 @@ class W25Q64FV(SPI):
         if addr > self.MAX_WORDS and command != self.COMMAND_ERASE_CHIP:
             raise ValueError("Out of range for flash memory size")
 
-        # check that the flash memory is not busy
-        reg = self.status_registers()
-        if reg[0] & 0x01:
-            raise ProtocolError("Flash memory is busy")
+        # wait for any previous operation to complete
+        self.wait_ready()
 
         # enable write
-        if reg[0] & 0x02 == 0:
-            self.write_enable()
+        self.write_enable()
 
         header = [command]
         if command != self.COMMAND_ERASE_CHIP:
             header += list(addr.to_bytes(3, 'big'))
         self.write_then_read(len(header), 0, header)
+        self._busy(command)
+
+    @instrumented('W25Q64FV.update')
+    def update(self, addr, data):
+        """
+        Update the flash memory so that it contains data at addr, touching only
+        what differs. The current contents are read back sector by sector and
+        compared against the target image:
+
+        - sectors that already match are skipped
+        - sectors that only need bits cleared (1 -> 0) are programmed without
+          erasing, and only the pages that differ
+        - any other sector is erased and programmed, skipping the pages that
+          are all 0xFF after the erase
+
+        Bytes outside the given range but within a touched sector are preserved.
+
+        Parameters
+        ----------
+        addr : int
+            Three byte address in the flash memory
+        data : bytes
+            The bytes the flash memory should contain
+
+        Returns
+        ----------
+        dict
+            A dictionary containing the following keys:
+            - 'sectors': int, number of sectors compared
+            - 'erased': list of int, addresses of the erased sectors
+            - 'pages': int, number of pages programmed
+
+        Raises
+        ------
+        ValueError
+            If the address is out of range for the flash memory size
+        ProtocolError
+            If the flash memory stays busy
+
+        Examples
+        --------
+        >>> with open('flash.img', 'rb') as f:
+        ...     winbond.update(0x000000, f.read())
+        """
+
+        if addr + len(data) > self.MAX_WORDS:
+            raise ValueError("Out of range for flash memory size")
+
+        data = memoryview(data).cast('B')
+        start = addr - addr % self.SECTOR_SIZE
+        end = addr + len(data)
+        end += -end % self.SECTOR_SIZE
+
+        # read everything first
+        plan = []
+        for sector_addr, current in zip(range(start, end, self.SECTOR_SIZE),
+                                        self.iter_read(start, end - start, self.SECTOR_SIZE)):
+            lo = max(addr, sector_addr)
+            hi = min(addr + len(data), sector_addr + self.SECTOR_SIZE)
+            if hi - lo == self.SECTOR_SIZE:
+                # refer to the caller's buffer, only partial sectors are copied
+                target = data[lo - addr:hi - addr]
+            else:
+                target = bytearray(current)
+                target[lo - sector_addr:hi - sector_addr] = data[lo - addr:hi - addr]
+            if target == current:
+                continue
+
+            # programming can only clear bits, an erase is needed to set them
+            t = int.from_bytes(target, 'big')
+            erase = int.from_bytes(current, 'big') & t != t
+            pages = []
+            for offset in range(0, self.SECTOR_SIZE, self.PAGE_SIZE):
+                page = target[offset:offset + self.PAGE_SIZE]
+                if erase:
+                    dirty = page != self.BLANK_PAGE
+                else:
+                    dirty = page != current[offset:offset + self.PAGE_SIZE]
+                if dirty:
+                    pages.append(offset)
+            plan.append((sector_addr, erase, target, pages))
+
+        # erase runs of contiguous sectors with the largest blocks possible
+        erased = [sector_addr for sector_addr, erase, _, _ in plan if erase]
+        run_start = None
+        for i, sector_addr in enumerate(erased):
+            if run_start is None:
+                run_start = sector_addr
+            if i + 1 == len(erased) or erased[i + 1] != sector_addr + self.SECTOR_SIZE:
+                self.erase_range(run_start, sector_addr + self.SECTOR_SIZE - run_start)
+                run_start = None
+
+        # program runs of contiguous dirty pages with a single store each, so
+        # they do not pay the ready checks of a store per page
+        runs = []
+        run_end = None
+        for sector_addr, erase, target, pages in plan:
+            for offset in pages:
+                page = target[offset:offset + self.PAGE_SIZE]
+                if sector_addr + offset == run_end:
+                    runs[-1][1].append(page)
+                else:
+                    runs.append((sector_addr + offset, [page]))
+                run_end = sector_addr + offset + self.PAGE_SIZE
+
+        programmed = 0
+        for run_addr, pages in runs:
+            self.store(run_addr, pages[0] if len(pages) == 1 else b''.join(pages))
+            programmed += len(pages)
+
+        return {
+            'sectors': (end - start) // self.SECTOR_SIZE,
+            'erased': erased,
+            'pages': programmed,
+        }
+
+    @instrumented('W25Q64FV.wait_ready')
+    def wait_ready(self, timeout=None):
+        """
+        Wait until the flash memory clears the BUSY bit of the status register 1.
+
+        The status register is polled with an adaptive backoff tuned to the last
+        started operation (page program, sector/block erase or chip erase): the
+        first poll is delayed until the operation is expected to complete,
+        based on the fastest completion observed so far (capped to the
+        datasheet typical time) or the typical time, and the interval between
+        polls doubles up to a quarter of the typical time. Timings are recorded
+        in busy_stats.
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum time to wait in seconds, by default twice the datasheet
+            maximum time of the last started operation
+
+        Raises
+        ------
+        ProtocolError
+            If the flash memory is still busy after the timeout
+
+        Examples
+        --------
+        >>> winbond.erase(winbond.COMMAND_ERASE_SECTOR, 0x000000)
+        >>> winbond.wait_ready()
+        >>> winbond.busy_stats['sector_erase']
+        {'count': 1, 'total': 0.0512, 'min': 0.0512, 'max': 0.0512, 'polls': 3}
+        """
+
+        command = self._busy_command
+        if command is None:
+            self._busy_since = time.monotonic()
+        typical, maximum = self.BUSY_TIMES.get(command, (0.01, 1.0))
+        if timeout is None:
+            timeout = maximum * 2
+        name = self.BUSY_OPERATIONS.get(command)
+        stats = self.busy_stats.get(name)
+
+        # do not poll before the operation is expected to complete, never
+        # later than the typical time
+        expected = typical / 2 if stats is None else min(stats['min'] * 0.9, typical)
+        delay = self._busy_since + expected - time.monotonic()
+        if command is not None and delay > 0:
+            self.timeout(delay)
+
+        interval = typical / 16
+        polls = 0
+        while True:
+            # compare against the time the poll was sent, not received, so the
+            # link latency does not count against the timeout
+            sent = time.monotonic()
+            polls += 1
+            if not self.write_then_read(1, 1, [self.COMMAND_READ_STATUS_REG_1])[0] & 0x01:
+                break
+            if sent - self._busy_since > timeout:
+                raise ProtocolError("Flash memory is busy")
+            self.timeout(interval)
+            interval = min(interval * 2, typical / 4)
+
+        self._busy_command = None
+        if name is None:
+            return
+
+        # the operation completed before the last poll was sent, the time
+        # spent waiting for its reply is link latency
+        elapsed = sent - self._busy_since
+        if stats is None:
+            stats = self.busy_stats[name] = {'count': 0, 'total': 0.0, 'min': elapsed, 'max': elapsed, 'polls': 0}
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['min'] = min(stats['min'], elapsed)
+        stats['max'] = max(stats['max'], elapsed)
+        stats['polls'] += polls
+
+    def _busy(self, command):
+        """ Record an operation that sets the BUSY bit, for wait_ready """
+        self._busy_command = command
+        self._busy_since = time.monotonic()
+
+    def erase_plan(self, start, length):
+        """
+        Calculate the smallest set of erase commands covering a range. Larger
+        blocks are preferred as they are much faster per byte, 4KB sectors are
+        used at the unaligned edges and the chip erase when the range covers the
+        whole flash memory.
+
+        Parameters
+        ----------
+        start : int
+            Three byte address in the flash memory, 4KB sector aligned
+        length : int
+            The number of bytes to erase, multiple of the 4KB sector size
+
+        Returns
+        ----------
+        list
+            A list of (command, addr) tuples, as taken by the erase method
+
+        Raises
+        ------
+        ValueError
+            If the range is out of range for the flash memory size or it is
+            not aligned to sector boundaries
+
+        Examples
+        --------
+        >>> winbond.erase_plan(0x00F000, 0x11000)
+        [(32, 61440), (216, 65536)]
+        """
+
+        if start < 0 or length <= 0 or start + length > self.MAX_WORDS:
+            raise ValueError("Out of range for flash memory size")
+        if start % self.SECTOR_SIZE or length % self.SECTOR_SIZE:
+            raise ValueError("Range must be aligned to %d bytes sectors" % self.SECTOR_SIZE)
+
+        if start == 0 and length == self.MAX_WORDS:
+            return [(self.COMMAND_ERASE_CHIP, 0x000000)]
+
+        plan = []
+        addr = start
+        end = start + length
+        while addr < end:
+            for command, size in self.ERASE_SIZES.items():
+                if addr % size == 0 and addr + size <= end:
+                    plan.append((command, addr))
+                    addr += size
+                    break
+
+        return plan
+
+    def erase_time(self, plan):
+        """
+        Estimate how long an erase plan takes to run.
+
+        Parameters
+        ----------
+        plan : list
+            A list of (command, addr) tuples, as returned by erase_plan
+
+        Returns
+        ----------
+        tuple
+            The typical and maximum erase time in seconds
+
+        Examples
+        --------
+        >>> winbond.erase_time(winbond.erase_plan(0x000000, 0x20000))
+        (0.3, 4.0)
+        """
+
+        typical = sum(self.ERASE_TIMES[command][0] for command, _ in plan)
+        maximum = sum(self.ERASE_TIMES[command][1] for command, _ in plan)
+
+        return typical, maximum
+
+    @instrumented('W25Q64FV.erase_range')
+    def erase_range(self, start, length, dry_run=False):
+        """
+        Erase a range of the flash memory using the smallest set of erase
+        commands (see erase_plan), waiting for each of them to complete.
+
+        Parameters
+        ----------
+        start : int
+            Three byte address in the flash memory, 4KB sector aligned
+        length : int
+            The number of bytes to erase, multiple of the 4KB sector size
+        dry_run : bool
+            Only calculate the plan, do not erase anything
+
+        Returns
+        ----------
+        list
+            The executed list of (command, addr) tuples
+
+        Raises
+        ------
+        ValueError
+            If the range is out of range for the flash memory size or it is
+            not aligned to sector boundaries
+        ProtocolError
+            If the flash memory stays busy
+
+        Examples
+        --------
+        >>> plan = winbond.erase_range(0x000000, 0x20000, dry_run=True)
+        >>> winbond.erase_time(plan)
+        (0.3, 4.0)
+        >>> winbond.erase_range(0x000000, 0x20000)
+        """
+
+        plan = self.erase_plan(start, length)
+        if dry_run:
+            return plan
+
+        for command, addr in plan:
+            self.erase(command, addr)
+            self.wait_ready()
+
+        return plan
 
     def status_registers(self):
         """
@@ -0,0 +1,253 @@
+import json
+import os
+import tempfile
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError: # not on Windows
+    fcntl = None
+
+from hackPyrateBus.cache import ImageCache
+from hackPyrateBus.journal import capacity, recover
+from vendor.pyBusPirateLite.base import ProtocolError
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'hackPyrateBus', 'speeds.json')
+
+
+def chip_key(device):
+    """
+    Key the tuned speed of a chip is cached under. The W25Q64FV IDs are read
+    at the slowest bus speed, the current speed may not be reliable, and the
+    speed is restored afterwards.
+
+    Parameters
+    ----------
+    device : W25Q64FV or AT24CXXX
+        The memory
+
+    Returns
+    -------
+    str
+        The W25Q64FV JEDEC and unique IDs (see ImageCache.key), or the
+        AT24CXXX size and address as it has no unique ID, e.g. 'AT24C256-0x50'
+    """
+
+    if not hasattr(device, 'info'):
+        return 'AT24C%d-0x%02x' % (device.size, device.device_address >> 1)
+
+    speed = device.speed
+    device.speed = min(device.SPEEDS, key=device.SPEEDS.get)
+    try:
+        return ImageCache.key(device.info())
+    finally:
+        if speed is not None:
+            device.speed = speed
+
+
+def default_samples(device):
+    """ Regions read back at every speed: eight pages spread over the memory,
+    small enough to be read within the timeout at the slowest speed """
+    size = capacity(device)
+    return [(i * size // 8, device.PAGE_SIZE) for i in range(8)]
+
+
+def fingerprint(device, samples):
+    """
+    Read the sample regions and identify the chip.
+
+    Parameters
+    ----------
+    device : W25Q64FV or AT24CXXX
+        The memory
+    samples : list
+        (addr, length) regions to read, at most 4096 bytes each
+
+    Returns
+    -------
+    tuple
+        The chip identification (W25Q64FV.info, None for the AT24CXXX) and the
+        CRC32 of the regions
+    """
+
+    crc = 0
+    if hasattr(device, 'info'):
+        info = device.info()
+        for data in device.iter_read_ranges(samples):
+            crc = zlib.crc32(data, crc)
+    else:
+        info = None
+        for addr, length in samples:
+            crc = zlib.crc32(device.load(addr, length), crc)
+
+    return info, crc
+
+
+def tune(device, speeds=None, samples=None, repeats=3):
+    """
+    Find the fastest reliable bus speed of a connected chip.
+
+    The speeds are tried from the slowest up. At every speed the chip
+    identification and the sample regions are read back repeats times and
+    compared against a reference taken at the slowest speed: any difference or
+    protocol error marks the speed unreliable and ends the search, as faster
+    ones would not fare better. The device is left at the fastest reliable
+    speed.
+
+    Only the bus speed (SPI.SPEEDS/I2C.SPEEDS) is tuned: the Bus Pirate binary
+    mode has no command to change the host serial link rate.
+
+    Parameters
+    ----------
+    device : W25Q64FV or AT24CXXX
+        The memory, already configured (pins, power...)
+    speeds : list
+        Speeds to try, by default all the supported ones
+    samples : list
+        (addr, length) regions to read back, see default_samples
+    repeats : int
+        Read-backs per speed
+
+    Returns
+    -------
+    dict
+        A dictionary containing the following keys:
+        - 'speed': str, the fastest reliable speed
+        - 'results': dict, speed -> {'reliable': bool, 'seconds': float}, the
+          seconds being the mean time of a read-back
+
+    Raises
+    ------
+    ProtocolError
+        If the read-back is not consistent even at the slowest speed
+
+    Examples
+    --------
+    >>> from hackPyrateBus import autotune
+    >>> autotune.tune(winbond)['speed']
+    '4MHz'
+    """
+
+    if speeds is None:
+        speeds = sorted(device.SPEEDS, key=device.SPEEDS.get)
+    if samples is None:
+        samples = default_samples(device)
+
+    device.speed = speeds[0]
+    reference = fingerprint(device, samples)
+
+    best = None
+    results = {}
+    for speed in speeds:
+        start = time.perf_counter()
+        try:
+            device.speed = speed
+            reliable = all(fingerprint(device, samples) == reference for _ in range(repeats))
+        except IOError:
+            reliable = False
+            try:
+                recover(device)
+            except IOError:
+                pass
+        results[speed] = {'reliable': reliable, 'seconds': (time.perf_counter() - start) / repeats}
+        if not reliable:
+            break
+        best = speed
+
+    if best is None:
+        raise ProtocolError("Inconsistent read-back at %s" % speeds[0])
+    device.speed = best
+
+    return {
+        'speed': best,
+        'results': results,
+    }
+
+
+def autotune(device, path=DEFAULT_PATH, retune=False, **kwargs):
+    """
+    Set the fastest reliable bus speed of a chip, tuning it (see tune) the
+    first time the chip is seen and reusing the speed cached in a JSON file
+    afterwards. A cached W25Q64FV speed is only used if the chip IDs read at
+    that speed match the ones read at the slowest speed, otherwise the chip
+    is tuned again.
+
+    Parameters
+    ----------
+    device : W25Q64FV or AT24CXXX
+        The memory, already configured (pins, power...)
+    path : str
+        JSON file the tuned speeds are cached in, per chip (see chip_key)
+    retune : bool
+        Tune again even if a speed is cached, e.g. after changing the fixture
+    kwargs
+        Extra parameters for tune (speeds, samples, repeats)
+
+    Returns
+    -------
+    dict
+        A dictionary containing the following keys:
+        - 'key': str, the chip key
+        - 'speed': str, the speed set
+        - 'cached': bool, whether the speed came from the cache
+        - 'results': dict, the tune results, None when cached
+
+    Examples
+    --------
+    >>> from hackPyrateBus.autotune import autotune
+    >>> autotune(winbond)
+    {'key': 'ef4017-d163880b1f622c2a', 'speed': '4MHz', 'cached': True, 'results': None}
+    """
+
+    key = chip_key(device)
+    try:
+        with open(path) as f:
+            speeds = json.load(f)
+    except (OSError, ValueError):
+        speeds = {}
+
+    entry = speeds.get(key)
+    if entry is not None and not retune and entry['speed'] in device.SPEEDS:
+        try:
+            device.speed = entry['speed']
+            reliable = not hasattr(device, 'info') or ImageCache.key(device.info()) == key
+        except IOError:
+            reliable = False
+            recover(device)
+        if reliable:
+            return {'key': key, 'speed': entry['speed'], 'cached': True, 'results': None}
+
+    result = tune(device, **kwargs)
+    _save_speed(path, key, {'speed': result['speed'], 'tuned': time.time()})
+
+    return {'key': key, 'speed': result['speed'], 'cached': False, 'results': result['results']}
+
+
+def _save_speed(path, key, entry):
+    """ Add the speed of a chip to the JSON file, keeping the speeds saved by
+    other processes since it was read """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # the lock serializes the read-modify-write of concurrent runs, the file
+    # itself is replaced so it cannot be locked
+    with open(path + '.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path) as f:
+                speeds = json.load(f)
+        except (OSError, ValueError):
+            speeds = {}
+        speeds[key] = entry
+
+        # write a unique temporary file then rename, readers never see a
+        # truncated file
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(speeds, f, indent=2)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
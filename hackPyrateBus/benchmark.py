@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import time
+
+from hackPyrateBus import __version__
+from hackPyrateBus.AT24CXXX import AT24CXXX
+from hackPyrateBus.W25Q64FV import W25Q64FV
+
+
+def measure(device, name, amount, func, **params):
+    """
+    Run func once and measure its throughput.
+
+    Parameters
+    ----------
+    device : BusPirate
+        The device, with instrumentation enabled (see BusPirate.instrument)
+    name : str
+        Name of the benchmark
+    amount : int
+        Payload bytes moved by func, used to compute the throughput
+    func : callable
+        The operation to measure
+    params
+        Parameters recorded along with the result (speed, chunk size...)
+
+    Returns
+    -------
+    dict
+        The benchmark result
+    """
+
+    stats = device.stats
+    stats.reset()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    return {
+        'name': name,
+        **params,
+        'bytes': amount,
+        'seconds': seconds,
+        'bytes_per_second': amount / seconds if seconds else None,
+        'writes': stats.writes,
+        'reads': stats.responses,
+        'bytes_out': stats.bytes_out,
+        'bytes_in': stats.bytes_in,
+        'round_trips': stats.round_trips,
+        'round_trips_per_kib': stats.round_trips * 1024 / amount if amount else None,
+        'short_reads': stats.short_reads,
+        'io_time': stats.write_time + stats.read_time,
+        'sleep_time': stats.sleep_time,
+        'operations': stats.operations,
+    }
+
+
+def bench_w25q64fv(winbond, speeds, chunk_sizes, size, addr=0x000000, destructive=False):
+    """
+    Benchmark the W25Q64FV read (read, and iter_read per chunk size),
+    program and erase paths and SPI transfer.
+
+    Parameters
+    ----------
+    winbond : W25Q64FV
+        The flash memory, with instrumentation enabled
+    speeds : list
+        SPI speeds to run the benchmarks at (see SPI.SPEEDS)
+    chunk_sizes : list
+        Read chunk sizes for the iter_read benchmark
+    size : int
+        Bytes read/programmed/erased by every benchmark
+    addr : int
+        Start address of the benchmarked region, 64KB aligned
+    destructive : bool
+        Run the erase and program benchmarks, which overwrite the region
+
+    Returns
+    -------
+    list
+        The benchmark results
+    """
+
+    results = []
+    data = os.urandom(size)
+    for speed in speeds:
+        winbond.speed = speed
+        results.append(measure(winbond, 'W25Q64FV.read', size, lambda: winbond.read(addr, size), speed=speed))
+        for chunk_size in chunk_sizes:
+            results.append(measure(winbond, 'W25Q64FV.iter_read', size,
+                                   lambda: sum(len(chunk) for chunk in winbond.iter_read(addr, size, chunk_size)),
+                                   speed=speed, chunk_size=chunk_size))
+        if destructive:
+            results.append(measure(winbond, 'W25Q64FV.erase', size,
+                                   lambda: winbond.erase_range(addr, size), speed=speed))
+            results.append(measure(winbond, 'W25Q64FV.store', size,
+                                   lambda: winbond.store(addr, data), speed=speed))
+        results.append(measure(winbond, 'SPI.transfer', 16 * 64,
+                               lambda: [winbond.transfer(data[:16]) for _ in range(64)], speed=speed))
+
+    return results
+
+
+def bench_at24cxxx(at24c, speeds, size, addr=0x0000, destructive=False):
+    """
+    Benchmark the AT24CXXX load and store paths and I2C transfer.
+
+    Parameters
+    ----------
+    at24c : AT24CXXX
+        The EEPROM, with instrumentation enabled
+    speeds : list
+        I2C speeds to run the benchmarks at (see I2C.SPEEDS)
+    size : int
+        Bytes loaded/stored by every benchmark
+    addr : int
+        Start address of the benchmarked region
+    destructive : bool
+        Run the store benchmark, which overwrites the region
+
+    Returns
+    -------
+    list
+        The benchmark results
+    """
+
+    results = []
+    data = os.urandom(size)
+    for speed in speeds:
+        at24c.speed = speed
+        results.append(measure(at24c, 'AT24CXXX.load', size, lambda: at24c.load(addr, size), speed=speed))
+        if destructive:
+            results.append(measure(at24c, 'AT24CXXX.store', size, lambda: at24c.store(addr, data), speed=speed))
+        results.append(measure(at24c, 'I2C.transfer', 16 * 64,
+                               lambda: [at24c.transfer(data[:16]) for _ in range(64)], speed=speed))
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Throughput benchmarks for hackPyrateBus')
+    parser.add_argument('chip', choices=['w25q64fv', 'at24cxxx'])
+    parser.add_argument('--port', default='', help='Bus Pirate port, autodetected by default')
+    parser.add_argument('--simulate', action='store_true', help='run against the emulated Bus Pirate')
+    parser.add_argument('--latency', type=float, default=0.0, help='emulated link latency in seconds')
+    parser.add_argument('--bandwidth', type=float, default=11520, help='emulated link bandwidth in bytes per second')
+    parser.add_argument('--timeout', type=float, default=5.0, help='serial read timeout in seconds')
+    parser.add_argument('--speeds', nargs='+', help='bus speeds, all supported speeds by default')
+    parser.add_argument('--chunk-sizes', nargs='+', type=int, default=[256, 1024, 4096])
+    parser.add_argument('--size', type=int, default=16384, help='bytes moved by every benchmark')
+    parser.add_argument('--address', type=lambda x: int(x, 0), default=0)
+    parser.add_argument('--destructive', action='store_true', help='also run the erase/program benchmarks, '
+                        'overwriting the benchmarked region (always enabled with --simulate)')
+    parser.add_argument('--output', default='-', help='JSON output file, stdout by default')
+    args = parser.parse_args(argv)
+
+    cls = W25Q64FV if args.chip == 'w25q64fv' else AT24CXXX
+    if args.simulate:
+        from hackPyrateBus.emulator import (AT24CXXXModel, BusPirateEmulator, EmulatedPort,
+                                            W25Q64FVModel, attach)
+
+        if cls is W25Q64FV:
+            emulator = BusPirateEmulator(spi=W25Q64FVModel())
+        else:
+            emulator = BusPirateEmulator(i2c=[AT24CXXXModel()])
+        device = cls(connect=False)
+        attach(device, EmulatedPort(emulator, args.timeout, args.latency, args.bandwidth))
+        args.destructive = True
+    else:
+        device = cls(portname=args.port, timeout=args.timeout)
+    device.instrument()
+
+    speeds = args.speeds or sorted(cls.SPEEDS, key=cls.SPEEDS.get)
+    if cls is W25Q64FV:
+        device.pins = W25Q64FV.PIN_POWER | W25Q64FV.PIN_CS
+        device.config = W25Q64FV.CFG_PUSH_PULL | W25Q64FV.CFG_CLK_EDGE
+        results = bench_w25q64fv(device, speeds, args.chunk_sizes, args.size, args.address, args.destructive)
+    else:
+        device.configure(power=True, pullup=True)
+        results = bench_at24cxxx(device, speeds, args.size, args.address, args.destructive)
+
+    report = {
+        'version': __version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'chip': args.chip,
+        'port': 'emulator' if args.simulate else device.portname,
+        'simulated': args.simulate,
+        'latency': args.latency if args.simulate else None,
+        'bandwidth': args.bandwidth if args.simulate else None,
+        'results': results,
+    }
+    if args.output == '-':
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import time
+
+from vendor.pyBusPirateLite.base import ProtocolError
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'hackPyrateBus', 'images')
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024 # bytes of cached images kept on disk
+
+
+class ImageCache:
+    """
+    Local cache of W25Q64FV images keyed by the chip JEDEC and unique IDs. For
+    every chip the last known full image is kept along with the SHA-1 of each
+    4KB sector. Dumping a chip that is already cached only reads a small
+    random sample of every sector, compares it against the cached image and
+    re-reads the sectors that changed, instead of reading the whole memory.
+    The least recently used images are evicted when the cache grows over its
+    maximum size.
+
+    Sampling is probabilistic: a change that does not cover the sampled bytes
+    goes unnoticed, which dump reports as a 'sampled' result. Use a larger
+    sample_size or a smaller stride (a sample_size equal to the stride for a
+    full comparison), or invalidate the chip after programming it outside the
+    library, when that matters. Every sample costs a read command round trip,
+    so a small stride only pays off on a fast link.
+    """
+
+    IMAGE = 'image.bin'
+    META = 'meta.json'
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_size=DEFAULT_MAX_SIZE):
+        """
+        Parameters
+        ----------
+        directory : str
+            Directory the images are stored in, created if needed
+        max_size : int
+            Maximum bytes of images kept, the least recently used are evicted
+
+        Examples
+        --------
+        >>> from hackPyrateBus.cache import ImageCache
+        >>> cache = ImageCache()
+        >>> result = cache.dump(winbond)
+        >>> shutil.copy(result['path'], 'flash.img')
+        """
+
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(info):
+        """
+        Cache key of a chip.
+
+        Parameters
+        ----------
+        info : dict
+            As returned by W25Q64FV.info
+
+        Returns
+        -------
+        str
+            The manufacturer, memory type and capacity JEDEC bytes followed by
+            the unique ID, e.g. 'ef4017-d163880b1f622c2a'
+        """
+
+        jedec = '%02x%02x%02x' % (int(info['manufacturer'], 16), int(info['memory_type'], 16),
+                                  info['capacity'].bit_length() - 1)
+        return '%s-%s' % (jedec, info['unique_id'][2:])
+
+    def path(self, key):
+        """ Path of the cached image of a chip """
+        return os.path.join(self.directory, key, self.IMAGE)
+
+    def dump(self, winbond, sample_size=16, stride=None, depth=1):
+        """
+        Dump the whole flash memory through the cache.
+
+        When the chip is not cached it is read completely. Otherwise every
+        sector is split in windows of stride bytes (the whole sector by
+        default), a sample of sample_size bytes at a random offset of every
+        window is read and compared against the cached image, and only the
+        sectors that differ, or whose cached contents no longer match their
+        hash, are read again. All the reads go through W25Q64FV.iter_read_ranges.
+
+        Parameters
+        ----------
+        winbond : W25Q64FV
+            The flash memory, already configured (pins, speed...)
+        sample_size : int
+            Bytes sampled per window, up to the stride (full comparison)
+        stride : int
+            Window size in bytes, a divisor of the sector size, the sector
+            size when None. Each window is a read command round trip: a page
+            stride (256) always samples a rewritten page, but its 16 round
+            trips per sector take nearly as long as reading the sector over
+            a slow link (11520 bytes/s, 16ms round trips)
+        depth : int
+            Number of read commands in flight, see W25Q64FV.iter_read
+
+        Returns
+        -------
+        dict
+            A dictionary containing the following keys:
+            - 'key': str, the cache key of the chip
+            - 'path': str, path of the up to date cached image
+            - 'hit': bool, whether the chip was already cached
+            - 'sampled': bool, whether the sectors not read were only checked
+              by sampling, so the image may miss changes outside the samples.
+              False when the whole memory was read or compared
+            - 'sectors': int, number of sectors of the image
+            - 'samples': int, number of sample ranges read to compare
+            - 'read': list of int, addresses of the sectors read
+
+        Raises
+        ------
+        ValueError
+            If the sample size or the stride is not supported
+        ProtocolError
+            If the flash memory stays busy, or reports a capacity larger
+            than MAX_WORDS (e.g. no chip connected)
+
+        Examples
+        --------
+        >>> cache.dump(winbond)
+        {'key': 'ef4017-d163880b1f622c2a', 'path': '...', 'hit': True, 'sampled': True, 'sectors': 2048, 'samples': 2048, 'read': [0, 4096]}
+        """
+
+        sector_size = winbond.SECTOR_SIZE
+        if stride is None:
+            stride = sector_size
+        if not 0 < stride <= sector_size or sector_size % stride:
+            raise ValueError("Stride must divide the %d bytes sector size" % sector_size)
+        if not 0 < sample_size <= stride:
+            raise ValueError("Sample size must be between 1 and %d bytes" % stride)
+
+        info = winbond.info()
+        size = info['capacity']
+        if not 0 < size <= winbond.MAX_WORDS:
+            raise ProtocolError("Unexpected flash capacity %#x, is the chip connected?" % size)
+        key = self.key(info)
+        sectors = size // sector_size
+        entry = os.path.join(self.directory, key)
+        image_path = os.path.join(entry, self.IMAGE)
+        meta = self._load_meta(key)
+        hit = (meta is not None and meta['size'] == size and meta['sector_size'] == sector_size and
+               os.path.exists(image_path) and os.path.getsize(image_path) == size)
+
+        os.makedirs(entry, exist_ok=True)
+        if hit:
+            hashes = meta['hashes']
+            windows = self._windows(sector_size, sample_size, stride)
+            sampled = sectors * len(windows)
+            stale = []
+            with open(image_path, 'rb') as image:
+                samples = winbond.iter_read_ranges(
+                    ((i * sector_size + offset, length) for i in range(sectors) for offset, length in windows), depth)
+                for i in range(sectors):
+                    image.seek(i * sector_size)
+                    cached = image.read(sector_size)
+                    # consume all the samples of the sector before comparing
+                    changed = [sample != cached[offset:offset + length]
+                               for (offset, length), sample in zip(windows, samples)]
+                    if any(changed) or hashlib.sha1(cached).hexdigest() != hashes[i]:
+                        stale.append(i)
+        else:
+            hashes = [None] * sectors
+            sampled = 0
+            stale = list(range(sectors))
+            with open(image_path, 'wb') as image:
+                image.truncate(size)
+
+        with open(image_path, 'r+b') as image:
+            contents = winbond.iter_read_ranges(((i * sector_size, sector_size) for i in stale), depth)
+            for i, data in zip(stale, contents):
+                image.seek(i * sector_size)
+                image.write(data)
+                hashes[i] = hashlib.sha1(data).hexdigest()
+
+        self._save_meta(key, {
+            'key': key,
+            'info': info,
+            'size': size,
+            'sector_size': sector_size,
+            'hashes': hashes,
+            'last_used': time.time(),
+        })
+        self.evict(keep=key)
+
+        return {
+            'key': key,
+            'path': image_path,
+            'hit': hit,
+            'sampled': hit and sample_size < stride and len(stale) < sectors,
+            'sectors': sectors,
+            'samples': sampled,
+            'read': [i * sector_size for i in stale],
+        }
+
+    @staticmethod
+    def _windows(sector_size, sample_size, stride):
+        """ (offset, length) of the samples of a sector, one at a random
+        offset of every stride, contiguous samples read as a single range """
+        rng = random.Random()
+        windows = []
+        for start in range(0, sector_size, stride):
+            offset = start + rng.randrange(stride - sample_size + 1)
+            if windows and sum(windows[-1]) == offset:
+                windows[-1] = (windows[-1][0], windows[-1][1] + sample_size)
+            else:
+                windows.append((offset, sample_size))
+        return windows
+
+    def invalidate(self, key):
+        """
+        Remove the cached image of a chip, e.g. after programming it.
+
+        Parameters
+        ----------
+        key : str
+            The cache key of the chip
+        """
+
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+
+    def entries(self):
+        """
+        List the cached images.
+
+        Returns
+        -------
+        list
+            (key, size, last_used) tuples, least recently used first
+        """
+
+        entries = []
+        for key in os.listdir(self.directory):
+            meta = self._load_meta(key)
+            image_path = self.path(key)
+            if meta is None or not os.path.exists(image_path):
+                continue
+            entries.append((key, os.path.getsize(image_path), meta['last_used']))
+
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used images until the cache fits in
+        max_size.
+
+        Parameters
+        ----------
+        keep : str
+            Key of an image that must not be evicted
+
+        Returns
+        -------
+        list
+            The keys of the evicted images
+        """
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for key, size, _ in entries:
+            if total <= self.max_size:
+                break
+            if key == keep:
+                continue
+            self.invalidate(key)
+            evicted.append(key)
+            total -= size
+
+        return evicted
+
+    def _load_meta(self, key):
+        try:
+            with open(os.path.join(self.directory, key, self.META)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_meta(self, key, meta):
+        # write then rename, an interrupted dump leaves the previous metadata
+        path = os.path.join(self.directory, key, self.META)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
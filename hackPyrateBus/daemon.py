@@ -0,0 +1,345 @@
+import argparse
+import contextlib
+import os
+import stat
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from vendor.pyBusPirateLite.base import BusPirate
+
+SOCKET_NAME = 'hackPyrateBus.sock'
+KEY_SUFFIX = '.key' # the authkey is stored next to the socket, address + KEY_SUFFIX
+
+
+def default_address():
+    """
+    Default path of the daemon Unix socket, in a directory only the current
+    user can access: $XDG_RUNTIME_DIR when set, otherwise a hackPyrateBus-<uid>
+    directory created in the temporary directory.
+
+    Returns
+    -------
+    str
+        The socket path
+
+    Raises
+    ------
+    PermissionError
+        If the directory is not private to the current user
+    """
+
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = os.path.join(tempfile.gettempdir(), 'hackPyrateBus-%d' % os.getuid())
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+    _check_private(directory)
+
+    return os.path.join(directory, SOCKET_NAME)
+
+
+def read_authkey(address):
+    """
+    Read the authkey written by a BusPirateDaemon next to its socket.
+
+    Parameters
+    ----------
+    address : str
+        Path of the daemon Unix socket
+
+    Returns
+    -------
+    bytes
+        The authkey
+
+    Raises
+    ------
+    PermissionError
+        If the key file is not private to the current user
+    """
+
+    path = address + KEY_SUFFIX
+    _check_private(path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _check_private(path):
+    # refuse anything another user could have created or can tamper with
+    st = os.lstat(path)
+    if stat.S_ISLNK(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError('%s must belong to the current user and not be accessible by others' % path)
+
+
+class _FifoLock:
+    """ Lock granted in request order, so clients are served as queued """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._next = 0
+        self._serving = 0
+
+    def acquire(self):
+        with self._cond:
+            ticket = self._next
+            self._next += 1
+            while ticket != self._serving:
+                self._cond.wait()
+
+    def release(self):
+        with self._cond:
+            self._serving += 1
+            self._cond.notify_all()
+
+
+class BusPirateDaemon:
+    """
+    Long-lived owner of a Bus Pirate serial port. The port is opened and the
+    binary mode entered once, then client processes are served over a Unix
+    socket one session at a time, in request order. Sessions get raw access
+    to the port, so the SPI/I2C classes run unmodified on the client side
+    (see session).
+
+    The socket is only accessible by the user running the daemon, and clients
+    must authenticate with an authkey before any message is exchanged: the
+    messages are pickled, they must never be accepted from or sent to
+    someone else.
+    """
+
+    def __init__(self, address=None, portname='', speed=115200, timeout=0.5, authkey=None):
+        """
+        Parameters
+        ----------
+        address : str
+            Path of the Unix socket to listen on, by default in a directory
+            private to the user (see default_address)
+        portname : str
+            Name of comport (/dev/bus_pirate or COM3), autodetected by default
+        speed : int
+            Communication speed, use default of 115200
+        timeout : int
+            Timeout in s to wait for reply
+        authkey : bytes
+            Key clients must know to connect. By default a random key is
+            generated and written to address + KEY_SUFFIX, readable only by
+            the user, where session finds it
+
+        Examples
+        --------
+        >>> from hackPyrateBus.daemon import BusPirateDaemon
+        >>> BusPirateDaemon().serve_forever()
+        """
+
+        self.address = address if address is not None else default_address()
+        self.device = BusPirate(portname, speed, timeout)
+        self.authkey = authkey
+        self._key_file = None
+        if authkey is None:
+            self.authkey = os.urandom(32)
+            self._key_file = self.address + KEY_SUFFIX
+        self.sessions = 0
+        self._lock = _FifoLock()
+        self._listener = None
+
+    def serve_forever(self):
+        """ Accept clients until interrupted, each one on its own thread """
+        for path in (self.address, self._key_file):
+            if path is not None and os.path.lexists(path):
+                os.unlink(path)
+
+        # only the owner of the daemon may use it, create the socket and the
+        # key file without any window where others can access them
+        umask = os.umask(0o177)
+        try:
+            if self._key_file is not None:
+                with open(os.open(self._key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+                    f.write(self.authkey)
+            self._listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        finally:
+            os.umask(umask)
+
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except (AuthenticationError, EOFError, ConnectionError):
+                    # wrong key or handshake aborted by the client
+                    continue
+                except OSError:
+                    break
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        """ Stop listening and close the serial port """
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        if self._key_file is not None and os.path.exists(self._key_file):
+            os.unlink(self._key_file)
+        self.device.disconnect()
+
+    def _handle(self, conn):
+        owner = False
+        clean = True
+        port = self.device.port
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    clean = not owner
+                    break
+                command = request[0]
+                if command == 'acquire':
+                    if not owner:
+                        self._lock.acquire()
+                        owner = True
+                        self.sessions += 1
+                    conn.send(self.device.mode)
+                elif not owner:
+                    conn.send(IOError('Session not acquired'))
+                    break
+                elif command == 'write':
+                    port.write(request[1])
+                elif command == 'read':
+                    conn.send(port.read(request[1]))
+                elif command == 'flush':
+                    port.reset_input_buffer()
+                elif command == 'release':
+                    self.device.mode = request[1]
+                    owner = False
+                    self._lock.release()
+                    conn.send(True)
+        finally:
+            conn.close()
+            if owner:
+                try:
+                    if not clean:
+                        # the client went away mid-session, the Bus Pirate may
+                        # be in the middle of a command: get back to bitbang
+                        self.device.enter_bb()
+                except IOError:
+                    self.device.mode = None
+                finally:
+                    self._lock.release()
+
+
+class DaemonPort:
+    """ pyserial-like port forwarding the traffic through a BusPirateDaemon """
+
+    def __init__(self, address=None, authkey=None):
+        if address is None:
+            address = default_address()
+        if authkey is None:
+            authkey = read_authkey(address)
+        self._conn = Client(address, family='AF_UNIX', authkey=authkey)
+        self.is_open = True
+
+    def _request(self, *request):
+        self._conn.send(request)
+        reply = self._conn.recv()
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def acquire(self):
+        """ Wait for the exclusive use of the Bus Pirate, returns its mode """
+        return self._request('acquire')
+
+    def release(self, mode):
+        """ Give the Bus Pirate back, reporting the mode it was left in """
+        return self._request('release', mode)
+
+    def write(self, data):
+        self._conn.send(('write', bytes(data)))
+        return len(data)
+
+    def read(self, size=1):
+        return self._request('read', size)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        self._conn.send(('flush',))
+
+    flushInput = reset_input_buffer
+
+    def close(self):
+        if self.is_open:
+            self._conn.close()
+            self.is_open = False
+
+
+@contextlib.contextmanager
+def session(cls, address=None, authkey=None, **kwargs):
+    """
+    Use the Bus Pirate owned by a BusPirateDaemon. The session waits for its
+    turn, skips the connection and binary mode handshake when the Bus Pirate
+    is already in the right mode, and has exclusive access until it ends. Bus
+    settings (speed, configuration, pins) are those left by the previous
+    session, set them as needed.
+
+    Parameters
+    ----------
+    cls : type
+        pyBusPirateLite based class (SPI, I2C, W25Q64FV, AT24CXXX...)
+    address : str
+        Path of the daemon Unix socket, see default_address
+    authkey : bytes
+        Key of the daemon, by default read from the key file it wrote next to
+        the socket (see read_authkey)
+    kwargs
+        Extra parameters for the class constructor
+
+    Examples
+    --------
+    >>> from hackPyrateBus.daemon import session
+    >>> from hackPyrateBus.W25Q64FV import W25Q64FV
+    >>> with session(W25Q64FV) as winbond:
+    ...     winbond.speed = '1MHz'
+    ...     winbond.info()
+    """
+
+    port = DaemonPort(address, authkey)
+    device = cls(connect=False, **kwargs)
+    try:
+        device.mode = port.acquire()
+        device.port = port
+        device.portname = address
+        device.connected = True
+        device.enter()
+        yield device
+    except BaseException:
+        # the Bus Pirate state is unknown, make the next session re-enter
+        # the binary mode from scratch
+        device.mode = None
+        raise
+    finally:
+        if port.is_open:
+            if device.port is port:
+                port.release(device.mode)
+            port.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Share a Bus Pirate between processes over a Unix socket')
+    parser.add_argument('--socket', default=None, help='Unix socket path, by default in $XDG_RUNTIME_DIR '
+                        'or a directory private to the user')
+    parser.add_argument('--port', default='', help='Bus Pirate port, autodetected by default')
+    parser.add_argument('--speed', type=int, default=115200)
+    parser.add_argument('--timeout', type=float, default=0.5)
+    args = parser.parse_args()
+
+    try:
+        BusPirateDaemon(args.socket, args.port, args.speed, args.timeout).serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,679 @@
+import os
+import select
+import threading
+import time
+
+class W25Q64FVModel:
+    """ Memory model of the Winbond W25Q64FV SPI flash memory """
+
+    PAGE_SIZE = 256
+    ERASE_SIZES = {0x20: 4096, 0x52: 32768, 0xD8: 65536}
+    # typical busy times in seconds (tPP, tSE, tBE1, tBE2, tCE)
+    BUSY_TIMES = {0x02: 0.0007, 0x20: 0.045, 0x52: 0.12, 0xD8: 0.15, 0x60: 20.0}
+
+    def __init__(self, size=8388608, unique_id=b'\xd1\x63\x88\x0b\x1f\x62\x2c\x2a', time_scale=1.0, image=None):
+        """
+        Parameters
+        ----------
+        size : int
+            Capacity in bytes, power of two
+        unique_id : bytes
+            The 64-bit unique ID returned by the 4Bh command
+        time_scale : float
+            Factor applied to the program/erase busy times, 0 disables them
+        image : bytes
+            Initial contents, by default the memory is erased (all 0xFF)
+        """
+
+        self.size = size
+        self.unique_id = unique_id
+        self.time_scale = time_scale
+        self.memory = bytearray(b'\xff') * size
+        if image is not None:
+            self.memory[:len(image)] = image
+        self.wel = False
+        self.busy_until = 0.0
+        self.violations = 0
+        self._tx = bytearray()
+
+    @property
+    def busy(self):
+        return time.monotonic() < self.busy_until
+
+    def select(self):
+        """ CS goes low """
+        self._tx = bytearray()
+
+    def deselect(self):
+        """ CS goes high, program/erase commands are executed """
+        tx = self._tx
+        self._tx = bytearray()
+        if not tx:
+            return
+        command = tx[0]
+        if command in (0x05, 0x35):
+            return
+        if self.busy:
+            # only the status registers can be read while busy
+            self.violations += 1
+            return
+        if command == 0x06:
+            self.wel = True
+        elif command == 0x04:
+            self.wel = False
+        elif command == 0x02 and self.wel and len(tx) > 4:
+            addr = int.from_bytes(tx[1:4], 'big') % self.size
+            page = addr - addr % self.PAGE_SIZE
+            data = tx[4:]
+            # only the last PAGE_SIZE bytes are kept, and they roll over the page
+            if len(data) > self.PAGE_SIZE:
+                addr = page + (addr + len(data) - self.PAGE_SIZE) % self.PAGE_SIZE
+                data = data[-self.PAGE_SIZE:]
+            for i, value in enumerate(data):
+                offset = page + (addr - page + i) % self.PAGE_SIZE
+                self.memory[offset] &= value
+            self._start(command)
+        elif command in self.ERASE_SIZES and self.wel and len(tx) >= 4:
+            size = self.ERASE_SIZES[command]
+            addr = int.from_bytes(tx[1:4], 'big') % self.size
+            addr -= addr % size
+            self.memory[addr:addr + size] = b'\xff' * size
+            self._start(command)
+        elif command in (0x60, 0xC7) and self.wel:
+            self.memory[:] = b'\xff' * self.size
+            self._start(0x60)
+
+    def _start(self, command):
+        self.wel = False
+        self.busy_until = time.monotonic() + self.BUSY_TIMES[command] * self.time_scale
+
+    def exchange(self, value):
+        """ Clock one byte in and return the byte clocked out """
+        out = self._output(len(self._tx), 1)
+        self._tx.append(value)
+        return out[0]
+
+    def clock_out(self, amount):
+        """ Clock out amount bytes, sending 0xFF """
+        out = self._output(len(self._tx), amount)
+        self._tx += b'\xff' * amount
+        return out
+
+    def _output(self, position, amount):
+        """ Bytes clocked out at the given position of the current transaction """
+        tx = self._tx
+        if not tx or amount == 0:
+            return b'\xff' * amount
+        command = tx[0]
+        if command == 0x05:
+            status = (0x01 if self.busy else 0x00) | (0x02 if self.wel else 0x00)
+            return self._pattern(b'\xff', bytes([status]), position, amount)
+        if command == 0x35:
+            return self._pattern(b'\xff', b'\x00', position, amount)
+        if self.busy:
+            return b'\xff' * amount
+        if command == 0x03 and position + amount > 4:
+            lead = max(4 - position, 0)
+            addr = int.from_bytes(tx[1:4], 'big') + position + lead - 4
+            return b'\xff' * lead + self._wrap(addr % self.size, amount - lead)
+        if command == 0x9F:
+            jedec = b'\xef\x40' + (self.size.bit_length() - 1).to_bytes(1, 'big')
+            return self._pattern(b'\xff' + jedec, b'\xff', position, amount)
+        if command == 0x90:
+            device_id = (self.size.bit_length() - 2).to_bytes(1, 'big')
+            return self._pattern(b'\xff' * 4 + b'\xef' + device_id, b'\xff', position, amount)
+        if command == 0x4B:
+            return self._pattern(b'\xff' * 5 + self.unique_id, b'\xff', position, amount)
+        return b'\xff' * amount
+
+    def _wrap(self, start, amount):
+        out = bytearray()
+        while amount > 0:
+            chunk = self.memory[start:start + amount]
+            out += chunk
+            amount -= len(chunk)
+            start = 0
+        return bytes(out)
+
+    @staticmethod
+    def _pattern(sequence, fill, position, amount):
+        """ Bytes [position, position + amount) of sequence followed by fill """
+        if position + amount > len(sequence):
+            sequence += fill * (position + amount - len(sequence))
+        return bytes(sequence[position:position + amount])
+
+
+class AT24CXXXModel:
+    """ Memory model of the AT24C128/256 I2C EEPROMs """
+
+    PAGE_SIZE = 64
+
+    def __init__(self, size=256, device_address=0x50, write_cycle=0.003, image=None):
+        """
+        Parameters
+        ----------
+        size : int
+            Size of the EEPROM in kbit (128 or 256)
+        device_address : int
+            I2C address of the EEPROM without the r/w bit
+        write_cycle : float
+            Duration of the self-timed write cycle in seconds
+        image : bytes
+            Initial contents, by default the memory is erased (all 0xFF)
+        """
+
+        self.size = size * 128
+        self.device_address = device_address
+        self.write_cycle = write_cycle
+        self.memory = bytearray(b'\xff') * self.size
+        if image is not None:
+            self.memory[:len(image)] = image
+        self.busy_until = 0.0
+        self.pointer = 0
+        self._state = None
+        self._received = bytearray()
+
+    @property
+    def busy(self):
+        return time.monotonic() < self.busy_until
+
+    def start(self):
+        self._commit()
+        self._state = 'address'
+
+    def stop(self):
+        self._commit()
+        self._state = None
+
+    def write(self, value):
+        """ A byte is written on the bus, returns True on ACK """
+        if self._state == 'address':
+            if value >> 1 != self.device_address or self.busy:
+                self._state = None
+                return False
+            self._state = 'read' if value & 1 else 'write'
+            self._received = bytearray()
+            return True
+        if self._state == 'write':
+            self._received.append(value)
+            if len(self._received) == 2:
+                self.pointer = int.from_bytes(self._received, 'big') % self.size
+            return True
+        return False
+
+    def read(self):
+        """ A byte is read from the bus """
+        if self._state != 'read':
+            return 0xFF
+        value = self.memory[self.pointer]
+        self.pointer = (self.pointer + 1) % self.size
+        return value
+
+    def _commit(self):
+        if self._state != 'write' or len(self._received) <= 2:
+            self._received = bytearray()
+            return
+        addr = int.from_bytes(self._received[:2], 'big') % self.size
+        page = addr - addr % self.PAGE_SIZE
+        for i, value in enumerate(self._received[2:]):
+            self.memory[page + (addr - page + i) % self.PAGE_SIZE] = value
+        self.pointer = page + (addr - page + len(self._received) - 2) % self.PAGE_SIZE
+        self._received = bytearray()
+        self.busy_until = time.monotonic() + self.write_cycle
+
+
+class BusPirateEmulator:
+    """
+    Software model of a Bus Pirate speaking the binary protocol: BBIO1 bitbang
+    mode, SPI1 and I2C1 modes with write then read, bulk transfer, CS, pins,
+    configuration and speed commands. Bus time is accounted for according to
+    the configured SPI/I2C speed.
+    """
+
+    SPI_SPEEDS = [30e3, 125e3, 250e3, 1e6, 2e6, 2.6e6, 4e6, 8e6]
+    I2C_SPEEDS = [5e3, 50e3, 100e3, 400e3]
+    BUFFER_SIZE = 4096
+
+    def __init__(self, spi=None, i2c=(), buzzpirateFirm=True, mode='bb'):
+        """
+        Parameters
+        ----------
+        spi : object
+            SPI device model, for example W25Q64FVModel
+        i2c : list
+            I2C device models on the bus, for example [AT24CXXXModel()]
+        buzzpirateFirm : bool
+            Emulate the https://buzzpirat.com/ firmware. Otherwise emulate the
+            BPv3.6 firmware, whose SPI write_then_read does not return the
+            success byte when no data is read.
+        mode : str
+            Initial mode, 'bb' (binary bitbang) or 'terminal' (user terminal,
+            20 0x00 bytes are needed to enter binary mode)
+
+        Examples
+        --------
+        >>> from hackPyrateBus.emulator import BusPirateEmulator, W25Q64FVModel
+        >>> emulator = BusPirateEmulator(spi=W25Q64FVModel())
+        """
+
+        self.spi = spi
+        self.i2c = list(i2c)
+        self.buzzpirateFirm = buzzpirateFirm
+        self.mode = mode
+        self.spi_speed = self.SPI_SPEEDS[0]
+        self.i2c_speed = self.I2C_SPEEDS[0]
+        self._in = bytearray()
+        self._out = []
+        self._protocol = self._run()
+        next(self._protocol)
+
+    def feed(self, data):
+        """
+        Process bytes sent by the host.
+
+        Parameters
+        ----------
+        data : bytes-like
+            Bytes received from the host
+
+        Returns
+        -------
+        list
+            A list of (bus_time, bytes) tuples: the bytes sent back to the host
+            and the time in seconds the Bus Pirate spent on the buses before
+            sending them
+        """
+
+        self._in += data
+        self._out = []
+        self._protocol.send(None)
+        return self._out
+
+    def _reply(self, data, bus_time=0.0):
+        self._out.append((bus_time, bytes(data)))
+
+    def _take(self, amount):
+        while len(self._in) < amount:
+            yield
+        data = bytes(self._in[:amount])
+        del self._in[:amount]
+        return data
+
+    def _run(self):
+        zeros = 0
+        while True:
+            command = (yield from self._take(1))[0]
+            if self.mode == 'terminal':
+                zeros = zeros + 1 if command == 0x00 else 0
+                if zeros >= 20:
+                    zeros = 0
+                    self.mode = 'bb'
+                    self._reply(b'BBIO1')
+            elif command == 0x00:
+                if self.mode == 'spi' and self.spi is not None:
+                    self.spi.deselect()
+                self.mode = 'bb'
+                self._reply(b'BBIO1')
+            elif self.mode == 'bb':
+                yield from self._bitbang(command)
+            elif self.mode == 'spi':
+                yield from self._spi(command)
+            elif self.mode == 'i2c':
+                yield from self._i2c(command)
+
+    def _bitbang(self, command):
+        if command == 0x01:
+            self.mode = 'spi'
+            self._reply(b'SPI1')
+        elif command == 0x02:
+            self.mode = 'i2c'
+            self._reply(b'I2C1')
+        elif command == 0x0f:
+            self.mode = 'terminal'
+            self._reply(b'\x01')
+        elif command == 0x14:
+            self._reply(b'\x00\x00')
+        elif command & 0xC0 in (0x40, 0x80):
+            self._reply(bytes([command & 0x7f]))
+        yield from ()
+
+    def _spi(self, command):
+        spi = self.spi
+        byte_time = 8 / self.spi_speed
+        if command == 0x01:
+            self._reply(b'SPI1')
+        elif command in (0x02, 0x03):
+            if spi is not None:
+                spi.select() if command == 0x02 else spi.deselect()
+            self._reply(b'\x01')
+        elif command in (0x04, 0x05):
+            lengths = yield from self._take(4)
+            numtx = int.from_bytes(lengths[:2], 'big')
+            numrx = int.from_bytes(lengths[2:], 'big')
+            if numtx > self.BUFFER_SIZE or numrx > self.BUFFER_SIZE:
+                self._reply(b'\x00')
+                return
+            txdata = yield from self._take(numtx)
+            data = b'\xff' * numrx
+            if spi is not None:
+                if command == 0x04:
+                    spi.select()
+                for value in txdata:
+                    spi.exchange(value)
+                data = spi.clock_out(numrx)
+                if command == 0x04:
+                    spi.deselect()
+            bus_time = (numtx + numrx) * byte_time
+            if numrx == 0 and not self.buzzpirateFirm:
+                return
+            self._reply(b'\x01' + data, bus_time)
+        elif command in (0x0d, 0x0e):
+            self._reply(b'\x01')
+            yield from self._take(1)
+            self._reply(b'\x01')
+        elif command & 0xF0 == 0x10:
+            txdata = yield from self._take((command & 0x0f) + 1)
+            rxdata = bytes(spi.exchange(value) if spi is not None else 0xFF for value in txdata)
+            self._reply(b'\x01' + rxdata, len(txdata) * byte_time)
+        elif command & 0xF0 == 0x60:
+            self.spi_speed = self.SPI_SPEEDS[command & 0x07]
+            self._reply(b'\x01')
+        elif command & 0xF0 in (0x40, 0x80, 0x90):
+            self._reply(b'\x01')
+
+    def _i2c_write(self, value):
+        acks = [device.write(value) for device in self.i2c]
+        return any(acks)
+
+    def _i2c_read(self):
+        value = 0xFF
+        for device in self.i2c:
+            value &= device.read()
+        return value
+
+    def _i2c(self, command):
+        byte_time = 9 / self.i2c_speed
+        if command == 0x01:
+            self._reply(b'I2C1')
+        elif command == 0x02:
+            for device in self.i2c:
+                device.start()
+            self._reply(b'\x01')
+        elif command == 0x03:
+            for device in self.i2c:
+                device.stop()
+            self._reply(b'\x01')
+        elif command == 0x04:
+            self._reply(bytes([self._i2c_read()]), byte_time)
+        elif command in (0x06, 0x07):
+            self._reply(b'\x01')
+        elif command == 0x08:
+            lengths = yield from self._take(4)
+            numtx = int.from_bytes(lengths[:2], 'big')
+            numrx = int.from_bytes(lengths[2:], 'big')
+            if numtx > self.BUFFER_SIZE or numrx > self.BUFFER_SIZE:
+                self._reply(b'\x00')
+                return
+            txdata = yield from self._take(numtx)
+            for device in self.i2c:
+                device.start()
+            for i, value in enumerate(txdata):
+                if not self._i2c_write(value):
+                    for device in self.i2c:
+                        device.stop()
+                    self._reply(b'\x00', (i + 1) * byte_time)
+                    return
+            data = bytes(self._i2c_read() for _ in range(numrx))
+            for device in self.i2c:
+                device.stop()
+            self._reply(b'\x01' + data, (numtx + numrx) * byte_time)
+        elif command & 0xF0 == 0x10:
+            txdata = yield from self._take((command & 0x0f) + 1)
+            acks = bytes(0x00 if self._i2c_write(value) else 0x01 for value in txdata)
+            self._reply(b'\x01' + acks, len(txdata) * byte_time)
+        elif command & 0xF0 == 0x60:
+            self.i2c_speed = self.I2C_SPEEDS[command & 0x03]
+            self._reply(b'\x01')
+        elif command & 0xF0 == 0x40:
+            self._reply(b'\x01')
+
+
+class EmulatedPort:
+    """
+    pyserial-like port object connected to a BusPirateEmulator, in the spirit
+    of pyserial's loop:// port. Link latency and bandwidth can be injected to
+    get realistic throughput figures.
+    """
+
+    def __init__(self, emulator, timeout=0.1, latency=0.0, bandwidth=None):
+        """
+        Parameters
+        ----------
+        emulator : BusPirateEmulator
+            The emulated Bus Pirate
+        timeout : float
+            Read timeout in seconds
+        latency : float
+            One-way link latency in seconds (e.g. USB frame and FTDI latency
+            timer)
+        bandwidth : float
+            Link bandwidth in bytes per second in each direction (for example
+            11520 for 115200 bps 8N1), unlimited by default
+
+        Examples
+        --------
+        >>> port = EmulatedPort(emulator, timeout=0.5, latency=0.001, bandwidth=11520)
+        """
+
+        self.emulator = emulator
+        self.timeout = timeout
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.is_open = True
+        self._rx = []
+        self._tx_free = 0.0
+        self._bp_free = 0.0
+        self._rx_free = 0.0
+        self._lock = threading.Lock()
+
+    def _transfer_time(self, amount):
+        return amount / self.bandwidth if self.bandwidth else 0.0
+
+    def write(self, data):
+        data = bytes(data)
+        with self._lock:
+            now = time.monotonic()
+            self._tx_free = max(now, self._tx_free) + self._transfer_time(len(data))
+            clock = max(self._tx_free + self.latency, self._bp_free)
+            for bus_time, out in self.emulator.feed(data):
+                clock += bus_time
+                self._rx_free = max(clock, self._rx_free) + self._transfer_time(len(out))
+                self._rx.append([self._rx_free + self.latency, out])
+            self._bp_free = clock
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        now = time.monotonic()
+        with self._lock:
+            return sum(len(out) for arrival, out in self._rx if arrival <= now)
+
+    def read(self, size=1):
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        data = bytearray()
+        while len(data) < size:
+            with self._lock:
+                arrival = self._rx[0][0] if self._rx else None
+                now = time.monotonic()
+                if arrival is not None and arrival <= now:
+                    chunk = self._rx[0]
+                    taken = chunk[1][:size - len(data)]
+                    data += taken
+                    chunk[1] = chunk[1][len(taken):]
+                    if not chunk[1]:
+                        self._rx.pop(0)
+                    continue
+            if deadline is not None and now >= deadline:
+                break
+            if arrival is None:
+                wait = deadline - now if deadline is not None else 0.001
+            else:
+                wait = arrival - now
+                if deadline is not None:
+                    wait = min(wait, deadline - now)
+            time.sleep(max(wait, 0))
+            if arrival is None and deadline is not None:
+                break
+        return bytes(data)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        now = time.monotonic()
+        with self._lock:
+            self._rx = [chunk for chunk in self._rx if chunk[0] > now]
+
+    flushInput = reset_input_buffer
+
+    def reset_output_buffer(self):
+        pass
+
+    flushOutput = reset_output_buffer
+
+    def close(self):
+        self.is_open = False
+
+
+class PtyServer:
+    """
+    Serve a BusPirateEmulator on a pseudo-terminal, so it can be opened as a
+    regular serial port, also from other processes.
+
+    Examples
+    --------
+    >>> server = PtyServer(BusPirateEmulator(spi=W25Q64FVModel()))
+    >>> server.start()
+    >>> winbond = W25Q64FV(portname=server.portname)
+    """
+
+    def __init__(self, emulator, latency=0.0, bandwidth=None):
+        """
+        Parameters
+        ----------
+        emulator : BusPirateEmulator
+            The emulated Bus Pirate
+        latency : float
+            Delay in seconds applied before every reply
+        bandwidth : float
+            Reply bandwidth in bytes per second, unlimited by default
+        """
+
+        self.emulator = emulator
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.portname = None
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """ Create the pseudo-terminal and start serving it on a thread """
+        # POSIX only, imported here so the emulator can be used on Windows
+        import tty
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.portname = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self.portname
+
+    def stop(self):
+        """ Stop serving and close the pseudo-terminal """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _serve(self):
+        while self._running:
+            readable, _, _ = select.select([self._master], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master, 65536)
+            except OSError:
+                break
+            for bus_time, out in self.emulator.feed(data):
+                delay = self.latency + bus_time
+                if self.bandwidth:
+                    delay += len(out) / self.bandwidth
+                if delay > 0:
+                    time.sleep(delay)
+                os.write(self._master, out)
+
+
+def attach(device, port):
+    """
+    Connect a pyBusPirateLite based object (SPI, I2C, W25Q64FV, AT24CXXX...)
+    created with connect=False to an emulated port and enter its mode.
+
+    Parameters
+    ----------
+    device : BusPirate
+        The device object, created with connect=False
+    port : EmulatedPort
+        The emulated port
+
+    Returns
+    -------
+    BusPirate
+        The given device
+
+    Examples
+    --------
+    >>> from hackPyrateBus.W25Q64FV import W25Q64FV
+    >>> from hackPyrateBus.emulator import BusPirateEmulator, EmulatedPort, W25Q64FVModel, attach
+    >>> port = EmulatedPort(BusPirateEmulator(spi=W25Q64FVModel()), timeout=0.5)
+    >>> winbond = attach(W25Q64FV(connect=False), port)
+    """
+
+    device.port = port
+    device.portname = 'emulator'
+    device.connected = True
+    device.enter()
+    return device
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve an emulated Bus Pirate on a pseudo-terminal')
+    parser.add_argument('--flash', metavar='IMAGE', nargs='?', const='', help='attach a W25Q64FV, optionally loaded from IMAGE')
+    parser.add_argument('--eeprom', metavar='IMAGE', nargs='?', const='', help='attach an AT24C256, optionally loaded from IMAGE')
+    parser.add_argument('--bpv36', action='store_true', help='emulate the BPv3.6 firmware write_then_read quirk')
+    parser.add_argument('--latency', type=float, default=0.0, help='reply latency in seconds')
+    parser.add_argument('--bandwidth', type=float, default=None, help='reply bandwidth in bytes per second')
+    args = parser.parse_args()
+
+    def load(path):
+        if not path:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    spi = W25Q64FVModel(image=load(args.flash)) if args.flash is not None else None
+    i2c = [AT24CXXXModel(image=load(args.eeprom))] if args.eeprom is not None else []
+    server = PtyServer(BusPirateEmulator(spi, i2c, buzzpirateFirm=not args.bpv36), args.latency, args.bandwidth)
+    print(server.start())
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,198 @@
+import queue
+import threading
+import time
+
+from vendor.pyBusPirateLite.base import BusPirate
+
+
+class Fleet:
+    """
+    Run jobs concurrently on every Bus Pirate attached to the host. There is a
+    worker thread per programmer, each one owning its serial port and taking
+    jobs from a shared queue, so the aggregate throughput scales with the
+    number of programmers. The serial I/O releases the GIL, threads are enough
+    to keep all the links busy.
+    """
+
+    def __init__(self, cls, ports=None, **kwargs):
+        """
+        Parameters
+        ----------
+        cls : type
+            pyBusPirateLite based class (W25Q64FV, AT24CXXX, SPI, I2C...)
+        ports : list
+            Port names of the programmers, all the detected ones by default
+            (see BusPirate.get_ports)
+        kwargs
+            Extra parameters for the class constructor (speed, timeout...)
+
+        Examples
+        --------
+        >>> from hackPyrateBus.fleet import Fleet
+        >>> from hackPyrateBus.W25Q64FV import W25Q64FV
+        >>> fleet = Fleet(W25Q64FV)
+        >>> fleet.ports
+        ['/dev/ttyUSB0', '/dev/ttyUSB1']
+        """
+
+        self.cls = cls
+        self.ports = list(ports) if ports is not None else BusPirate.get_ports()
+        self.kwargs = kwargs
+
+    def run(self, job, items=None, setup=None):
+        """
+        Run job once per item, on whichever programmer is free first, or once
+        on every programmer when no items are given.
+
+        Parameters
+        ----------
+        job : callable
+            Called as job(device, item), its return value is the result
+        items : iterable
+            The work items, shared by all the programmers. By default the job
+            runs exactly once on each programmer with a None item
+        setup : callable
+            Called as setup(device) once per programmer after connecting, to
+            configure pins, speed...
+
+        Returns
+        -------
+        list
+            One dictionary per item (per programmer, in the ports order, when
+            no items are given), with the keys:
+            - 'item': the work item
+            - 'port': str, the programmer that ran it
+            - 'result': the job return value, None on error
+            - 'error': the exception raised by the job, if any
+            - 'elapsed': float, seconds spent running the job
+
+        Examples
+        --------
+        >>> def dump(winbond, path):
+        ...     with open(path, 'wb') as f:
+        ...         return winbond.dump(f)
+        >>> results = fleet.run(dump, ['board1.img', 'board2.img', 'board3.img'],
+        ...                     setup=lambda winbond: setattr(winbond, 'speed', '8MHz'))
+        """
+
+        if not self.ports:
+            raise IOError('Could not autodetect a BusPirate device.')
+
+        failures = {}
+        if items is None:
+            # a job of its own per programmer, a faster one must not take it
+            results = [None] * len(self.ports)
+            queues = []
+            for index in range(len(self.ports)):
+                jobs = queue.Queue()
+                jobs.put((index, None))
+                queues.append(jobs)
+        else:
+            items = list(items)
+            results = [None] * len(items)
+            jobs = queue.Queue()
+            for index, item in enumerate(items):
+                jobs.put((index, item))
+            queues = [jobs] * len(self.ports)
+
+        workers = [threading.Thread(target=self._worker, args=(port, job, setup, jobs, results, failures), daemon=True)
+                   for port, jobs in zip(self.ports, queues)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        if items is None:
+            # programmers that could not be connected or set up
+            for index, port in enumerate(self.ports):
+                if results[index] is None:
+                    results[index] = self._result(None, port, None, failures.get(port), 0.0)
+            return results
+
+        # items left when every programmer failed
+        for index, item in enumerate(items):
+            if results[index] is None:
+                error = IOError('No programmer available (%s)' %
+                                ', '.join('%s: %s' % failure for failure in failures.items()))
+                results[index] = self._result(item, None, None, error, 0.0)
+
+        return results
+
+    def connect(self, port):
+        """ Create the device object of a programmer, override to customize """
+        return self.cls(portname=port, **self.kwargs)
+
+    @staticmethod
+    def _result(item, port, result, error, elapsed):
+        return {
+            'item': item,
+            'port': port,
+            'result': result,
+            'error': error,
+            'elapsed': elapsed,
+        }
+
+    def _worker(self, port, job, setup, jobs, results, failures):
+        try:
+            device = self.connect(port)
+        except Exception as e:
+            failures[port] = e
+            # leave the jobs to the other programmers
+            return
+
+        try:
+            if setup is not None:
+                try:
+                    setup(device)
+                except Exception as e:
+                    failures[port] = e
+                    return
+            while True:
+                try:
+                    index, item = jobs.get_nowait()
+                except queue.Empty:
+                    break
+                start = time.perf_counter()
+                try:
+                    result, error = job(device, item), None
+                except Exception as e:
+                    result, error = None, e
+                    try:
+                        # get the Bus Pirate back to a known state
+                        device.mode = None
+                        device.enter()
+                    except Exception:
+                        results[index] = self._result(item, port, result, error, time.perf_counter() - start)
+                        break
+                results[index] = self._result(item, port, result, error, time.perf_counter() - start)
+        finally:
+            device.disconnect()
+
+    @staticmethod
+    def summary(results):
+        """
+        Aggregate the results of run per programmer.
+
+        Parameters
+        ----------
+        results : list
+            The results returned by run
+
+        Returns
+        -------
+        dict
+            port -> {'jobs': int, 'errors': int, 'elapsed': float}
+
+        Examples
+        --------
+        >>> Fleet.summary(results)
+        {'/dev/ttyUSB0': {'jobs': 2, 'errors': 0, 'elapsed': 61.2}, '/dev/ttyUSB1': {'jobs': 1, 'errors': 0, 'elapsed': 30.4}}
+        """
+
+        summary = {}
+        for result in results:
+            port = summary.setdefault(result['port'], {'jobs': 0, 'errors': 0, 'elapsed': 0.0})
+            port['jobs'] += 1
+            port['errors'] += result['error'] is not None
+            port['elapsed'] += result['elapsed']
+        return summary
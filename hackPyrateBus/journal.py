@@ -0,0 +1,350 @@
+import json
+import os
+import zlib
+
+from vendor.pyBusPirateLite.base import ProtocolError
+
+DUMP_CHUNK = 4096 # bytes per journaled chunk of a dump
+
+
+class Journal:
+    """
+    Sidecar file of a long-running job, recording the chunks already completed
+    and their CRC32 so an interrupted job can be resumed. It is written as JSON
+    lines: a header describing the job followed by one line per chunk, flushed
+    to disk as soon as the chunk is done.
+    """
+
+    def __init__(self, path, header):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the journal file
+        header : dict
+            Description of the job, a journal written for a different job is
+            discarded
+        """
+
+        self.path = path
+        self.header = header
+        self.chunks = {}
+        self._file = None
+
+    def open(self):
+        """ Load the chunks completed by a previous run of the same job """
+        try:
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            lines = []
+
+        resume = False
+        for i, line in enumerate(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # torn line written while the job was interrupted
+                continue
+            if i == 0:
+                resume = entry == self.header
+                if not resume:
+                    break
+            else:
+                self.chunks[entry['offset']] = (entry['length'], entry['crc32'])
+
+        if resume:
+            self._file = open(self.path, 'a')
+        else:
+            self._file = open(self.path, 'w')
+            self._write(self.header)
+
+        return self
+
+    def done(self, offset, length, crc32):
+        """ Whether the chunk was completed with the same contents """
+        return self.chunks.get(offset) == (length, crc32)
+
+    def record(self, offset, length, crc32):
+        """ Record a completed chunk """
+        self.chunks[offset] = (length, crc32)
+        self._write({'offset': offset, 'length': length, 'crc32': crc32})
+
+    def close(self):
+        """ Close the journal file """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def capacity(device):
+    """ Size in bytes of the W25Q64FV/AT24CXXX memory """
+    if isinstance(device.MAX_WORDS, dict):
+        return device.MAX_WORDS[device.size]
+    return device.MAX_WORDS
+
+
+def recover(device, setup=None):
+    """
+    Get the Bus Pirate back to a known state after a failed transfer: the
+    binary mode is entered again from scratch and the bus settings known to
+    the device object (SPI pins, configuration and speed, I2C speed) are
+    applied again.
+
+    Parameters
+    ----------
+    device : BusPirate
+        The SPI/I2C device object
+    setup : callable
+        Called as setup(device) afterwards to restore any other setting, such
+        as the I2C power and pull-ups (configure)
+
+    Raises
+    ------
+    ProtocolError
+        If the Bus Pirate does not accept the settings, the link is still
+        unreliable
+    """
+
+    device.port.reset_input_buffer()
+    device.mode = None
+    device.enter()
+    try:
+        for name in ('pins', 'config', 'speed'):
+            value = getattr(device, name, None)
+            if value is not None:
+                setattr(device, name, value)
+        if setup is not None:
+            setup(device)
+    except ValueError as e:
+        # the pins and configuration setters raise ValueError on a bad reply
+        raise ProtocolError("Could not restore the bus settings: %s" % e) from e
+
+
+def _retry(device, func, retries, setup, stats):
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except IOError:
+            # ProtocolError, BPError and serial errors
+            if attempt == retries:
+                raise
+        stats['retries'] += 1
+        try:
+            recover(device, setup)
+        except IOError:
+            # the link is still down, the next attempt will tell
+            pass
+
+
+def _chunks(addr, amount, chunk_size):
+    """ Split a range into chunks aligned to chunk_size boundaries """
+    offset = 0
+    while offset < amount:
+        length = min(chunk_size - (addr + offset) % chunk_size, amount - offset)
+        yield offset, length
+        offset += length
+
+
+def dump(device, path, addr=0, amount=None, chunk_size=DUMP_CHUNK, retries=3, verify=False, setup=None):
+    """
+    Dump a W25Q64FV/AT24CXXX memory to a file, journaling the progress in the
+    sidecar file path + '.journal'. Failed chunks are retried after getting
+    the Bus Pirate back to a known state (see recover), and running the same
+    dump again after an interruption only reads the chunks that are missing
+    or no longer match their recorded CRC32. The journal is removed once the
+    dump is complete.
+
+    Parameters
+    ----------
+    device : W25Q64FV or AT24CXXX
+        The memory, already configured (pins, speed...)
+    path : str
+        Path of the image file
+    addr : int
+        Start address in the memory
+    amount : int
+        The number of bytes to dump, by default up to the end of the memory
+    chunk_size : int
+        Bytes per journaled chunk
+    retries : int
+        Maximum attempts per chunk after the first one
+    verify : bool
+        Read every chunk twice and retry when both reads differ
+    setup : callable
+        Called as setup(device) after recovering from a failure (see recover)
+
+    Returns
+    -------
+    dict
+        A dictionary containing the following keys:
+        - 'chunks': int, number of chunks read
+        - 'skipped': int, number of chunks completed by a previous run
+        - 'retries': int, number of failed attempts
+        - 'bytes': int, number of bytes read
+
+    Raises
+    ------
+    ValueError
+        If the range is out of range for the memory size
+    IOError
+        If a chunk still fails after all the retries, the dump can be resumed
+
+    Examples
+    --------
+    >>> from hackPyrateBus import journal
+    >>> journal.dump(winbond, 'flash.img')
+    {'chunks': 2048, 'skipped': 0, 'retries': 1, 'bytes': 8388608}
+    """
+
+    size = capacity(device)
+    if amount is None:
+        amount = size - addr
+    if addr < 0 or amount < 0 or addr + amount > size:
+        raise ValueError("Out of range for memory size")
+
+    read_into = device.read_into if hasattr(device, 'read_into') else device.load_into
+    header = {'job': 'dump', 'device': type(device).__name__, 'addr': addr, 'amount': amount,
+              'chunk_size': chunk_size}
+    stats = {'chunks': 0, 'skipped': 0, 'retries': 0, 'bytes': 0}
+    buffer = bytearray(chunk_size)
+    check = bytearray(chunk_size) if verify else None
+
+    with open(path, 'r+b' if os.path.exists(path) else 'w+b') as image, Journal(path + '.journal', header) as log:
+        image.truncate(amount)
+        for offset, length in _chunks(addr, amount, chunk_size):
+            chunk = memoryview(buffer)[:length]
+            if offset in log.chunks:
+                image.seek(offset)
+                image.readinto(chunk)
+                if log.done(offset, length, zlib.crc32(chunk)):
+                    stats['skipped'] += 1
+                    continue
+
+            def read():
+                read_into(addr + offset, chunk)
+                if verify:
+                    read_into(addr + offset, memoryview(check)[:length])
+                    if check[:length] != chunk:
+                        raise ProtocolError("Chunk at 0x%06X read back differently" % (addr + offset))
+
+            _retry(device, read, retries, setup, stats)
+            image.seek(offset)
+            image.write(chunk)
+            image.flush()
+            os.fsync(image.fileno())
+            log.record(offset, length, zlib.crc32(chunk))
+            stats['chunks'] += 1
+            stats['bytes'] += length
+
+    os.unlink(path + '.journal')
+
+    return stats
+
+
+def program(device, path, addr=0, chunk_size=None, retries=3, verify=True, setup=None):
+    """
+    Program a W25Q64FV/AT24CXXX memory from an image file, journaling the
+    progress in the sidecar file path + '.journal'. Every chunk is written
+    idempotently, so it can be safely retried after a failure: the W25Q64FV
+    is programmed sector by sector with update (erasing only when needed) and
+    the AT24CXXX page by page. Running the same program again after an
+    interruption skips the chunks already verified, unless their contents in
+    the image changed. The journal is removed once the program is complete.
+
+    Parameters
+    ----------
+    device : W25Q64FV or AT24CXXX
+        The memory, already configured (pins, speed...)
+    path : str
+        Path of the image file, read chunk by chunk
+    addr : int
+        Start address in the memory
+    chunk_size : int
+        Bytes per journaled chunk, by default the W25Q64FV sector size or the
+        AT24CXXX page size
+    retries : int
+        Maximum attempts per chunk after the first one
+    verify : bool
+        Read every chunk back and retry when it differs from the image
+    setup : callable
+        Called as setup(device) after recovering from a failure (see recover)
+
+    Returns
+    -------
+    dict
+        A dictionary containing the following keys:
+        - 'chunks': int, number of chunks programmed
+        - 'skipped': int, number of chunks completed by a previous run
+        - 'retries': int, number of failed attempts
+        - 'bytes': int, number of bytes programmed
+
+    Raises
+    ------
+    ValueError
+        If the image is empty or does not fit in the memory
+    IOError
+        If a chunk still fails after all the retries, the program can be
+        resumed
+
+    Examples
+    --------
+    >>> from hackPyrateBus import journal
+    >>> journal.program(winbond, 'flash.img')
+    {'chunks': 2048, 'skipped': 0, 'retries': 0, 'bytes': 8388608}
+    """
+
+    if chunk_size is None:
+        chunk_size = getattr(device, 'SECTOR_SIZE', device.PAGE_SIZE)
+    write = device.update if hasattr(device, 'update') else device.store
+    read_into = device.read_into if hasattr(device, 'read_into') else device.load_into
+    stats = {'chunks': 0, 'skipped': 0, 'retries': 0, 'bytes': 0}
+    source = bytearray(chunk_size)
+    buffer = bytearray(chunk_size)
+
+    with open(path, 'rb') as image:
+        amount = os.fstat(image.fileno()).st_size
+        if amount == 0:
+            raise ValueError("Empty image")
+        if addr < 0 or addr + amount > capacity(device):
+            raise ValueError("Out of range for memory size")
+
+        header = {'job': 'program', 'device': type(device).__name__, 'addr': addr, 'amount': amount,
+                  'chunk_size': chunk_size}
+        with Journal(path + '.journal', header) as log:
+            for offset, length in _chunks(addr, amount, chunk_size):
+                data = memoryview(source)[:length]
+                image.seek(offset)
+                image.readinto(data)
+                crc32 = zlib.crc32(data)
+                if log.done(offset, length, crc32):
+                    stats['skipped'] += 1
+                    continue
+
+                def store():
+                    write(addr + offset, data)
+                    if verify:
+                        chunk = memoryview(buffer)[:length]
+                        read_into(addr + offset, chunk)
+                        if chunk != data:
+                            raise ProtocolError("Chunk at 0x%06X failed verification" % (addr + offset))
+
+                _retry(device, store, retries, setup, stats)
+                log.record(offset, length, crc32)
+                stats['chunks'] += 1
+                stats['bytes'] += length
+
+    os.unlink(path + '.journal')
+
+    return stats
@@ -21,6 +21,9 @@ setup(
     install_requires=[
         'pyserial',
     ],
+    extras_require={
+        'adc': ['numpy'],
+    },
     long_description=read('README.md'),
     long_description_content_type='text/markdown',
     classifiers=[
@@ -0,0 +1,31 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+from hackPyrateBus import autotune
+
+
+def save_speeds(path, worker, count):
+    for i in range(count):
+        autotune._save_speed(path, '%d-%d' % (worker, i), {'speed': '1MHz', 'tuned': 0})
+
+
+class TestSaveSpeed(unittest.TestCase):
+
+    def test_concurrent(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'speeds.json')
+            workers = [multiprocessing.Process(target=save_speeds, args=(path, worker, 25)) for worker in range(8)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            with open(path) as f:
+                self.assertEqual(len(json.load(f)), 8 * 25)
+            self.assertEqual(sorted(os.listdir(directory)), ['speeds.json', 'speeds.json.lock'])
+
+
+if __name__ == '__main__':
+    unittest.main()
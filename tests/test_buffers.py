@@ -0,0 +1,60 @@
+import mmap
+import os
+import tempfile
+import unittest
+
+from hackPyrateBus.AT24CXXX import AT24CXXX
+from hackPyrateBus.W25Q64FV import W25Q64FV
+from hackPyrateBus.emulator import AT24CXXXModel, BusPirateEmulator, EmulatedPort, W25Q64FVModel, attach
+
+
+class TestBuffers(unittest.TestCase):
+
+    def setUp(self):
+        self.model = W25Q64FVModel(time_scale=0)
+        self.winbond = attach(W25Q64FV(connect=False), EmulatedPort(BusPirateEmulator(spi=self.model), timeout=1))
+        self.winbond.speed = '8MHz'
+
+    def tearDown(self):
+        self.assertEqual(self.model.violations, 0)
+
+    def test_store_memoryview(self):
+        data = bytearray(os.urandom(1000))
+        self.winbond.store(0x000010, memoryview(data)[100:])
+        self.assertEqual(self.model.memory[0x000010:0x000010 + 900], data[100:])
+
+    def test_store_combine(self):
+        data = os.urandom(1000)
+        self.winbond.store(0x000010, data, combine=True)
+        self.assertEqual(self.model.memory[0x000010:0x000010 + len(data)], data)
+
+    def test_mmap(self):
+        data = os.urandom(0x3000)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'flash.img')
+            with open(path, 'wb') as f:
+                f.write(data)
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+                self.winbond.store(0x001000, image)
+
+            with open(path, 'r+b') as f:
+                f.write(b'\x00' * len(data))
+                f.flush()
+                with mmap.mmap(f.fileno(), 0) as image:
+                    self.assertEqual(self.winbond.read_into(0x001000, image), len(data))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+
+    def test_load_into(self):
+        emulator = BusPirateEmulator(i2c=[AT24CXXXModel()])
+        at24c = attach(AT24CXXX(connect=False), EmulatedPort(emulator, timeout=1))
+        at24c.speed = '400kHz'
+        data = os.urandom(300)
+        at24c.store(0x0000, memoryview(data))
+        buffer = bytearray(400)
+        at24c.load_into(0x0000, memoryview(buffer)[:300])
+        self.assertEqual(buffer[:300], data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from hackPyrateBus.W25Q64FV import W25Q64FV
+from hackPyrateBus.cache import ImageCache
+from hackPyrateBus.emulator import BusPirateEmulator, EmulatedPort, W25Q64FVModel, attach
+from vendor.pyBusPirateLite.base import ProtocolError
+
+
+class TestImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.model = W25Q64FVModel(size=0x10000, time_scale=0, image=os.urandom(0x10000))
+        self.winbond = attach(W25Q64FV(connect=False), EmulatedPort(BusPirateEmulator(spi=self.model), timeout=1))
+        self.winbond.speed = '8MHz'
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ImageCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def image(self, result):
+        with open(result['path'], 'rb') as f:
+            return f.read()
+
+    def test_dump(self):
+        result = self.cache.dump(self.winbond)
+        self.assertEqual((result['hit'], result['sampled'], len(result['read'])), (False, False, 16))
+        self.assertEqual(self.image(result), self.model.memory)
+
+        result = self.cache.dump(self.winbond)
+        self.assertEqual((result['hit'], result['sampled'], result['read']), (True, True, []))
+        # a single sample window per sector by default
+        self.assertEqual(result['samples'], 16)
+
+    def test_rewritten_page(self):
+        self.cache.dump(self.winbond)
+        for page in range(0x5000, 0x6000, W25Q64FV.PAGE_SIZE):
+            self.winbond.update(page, os.urandom(W25Q64FV.PAGE_SIZE))
+            result = self.cache.dump(self.winbond, stride=W25Q64FV.PAGE_SIZE)
+            self.assertEqual((result['samples'], result['read']), (256, [0x5000]))
+            self.assertEqual(self.image(result), self.model.memory)
+
+    def test_full_comparison(self):
+        self.cache.dump(self.winbond)
+        self.winbond.update(0x2000, b'\x00')
+        result = self.cache.dump(self.winbond, sample_size=W25Q64FV.SECTOR_SIZE)
+        self.assertEqual((result['sampled'], result['read']), (False, [0x2000]))
+        self.assertEqual(self.image(result), self.model.memory)
+
+    def test_parameters(self):
+        with self.assertRaises(ValueError):
+            self.cache.dump(self.winbond, stride=300)
+        with self.assertRaises(ValueError):
+            self.cache.dump(self.winbond, sample_size=512, stride=256)
+
+    def test_no_chip(self):
+        winbond = attach(W25Q64FV(connect=False), EmulatedPort(BusPirateEmulator(), timeout=1))
+        with self.assertRaises(ProtocolError):
+            self.cache.dump(winbond)
+        self.assertEqual(self.cache.entries(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import unittest
+
+from hackPyrateBus.AT24CXXX import AT24CXXX
+from hackPyrateBus.W25Q64FV import W25Q64FV
+from hackPyrateBus.emulator import AT24CXXXModel, BusPirateEmulator, EmulatedPort, W25Q64FVModel, attach
+
+
+class TestW25Q64FV(unittest.TestCase):
+
+    def setUp(self):
+        self.model = W25Q64FVModel(time_scale=0)
+        self.winbond = attach(W25Q64FV(connect=False), EmulatedPort(BusPirateEmulator(spi=self.model), timeout=1))
+        self.winbond.speed = '8MHz'
+
+    def tearDown(self):
+        self.assertEqual(self.model.violations, 0)
+
+    def test_info(self):
+        info = self.winbond.info()
+        self.assertEqual(info['manufacturer'], '0xef')
+        self.assertEqual(info['unique_id'], '0xd163880b1f622c2a')
+        self.assertEqual(info['capacity'], W25Q64FV.MAX_WORDS)
+
+    def test_store_read(self):
+        data = os.urandom(3000)
+        # unaligned start, crosses several page boundaries
+        self.winbond.store(0x0010F0, data)
+        self.assertEqual(self.winbond.read(0x0010F0, len(data)), data)
+        self.assertEqual(bytes(self.model.memory[0x0010F0:0x0010F0 + len(data)]), data)
+        self.assertEqual(self.winbond.read(0x0010E0, 16), b'\xff' * 16)
+
+    def test_read_chunks(self):
+        data = os.urandom(10000)
+        self.model.memory[0x20000:0x20000 + len(data)] = data
+        self.assertEqual(b''.join(self.winbond.iter_read(0x20000, len(data), 1000)), data)
+        self.assertEqual(b''.join(self.winbond.iter_read(0x20000, len(data), depth=3)), data)
+        buffer = bytearray(len(data))
+        self.assertEqual(self.winbond.read_into(0x20000, buffer), len(data))
+        self.assertEqual(buffer, data)
+
+
+class TestAT24CXXX(unittest.TestCase):
+
+    def setUp(self):
+        emulator = BusPirateEmulator(i2c=[AT24CXXXModel()])
+        self.at24c = attach(AT24CXXX(connect=False), EmulatedPort(emulator, timeout=1))
+        self.at24c.speed = '400kHz'
+
+    def test_store_load(self):
+        data = os.urandom(1000)
+        self.at24c.store(100, data)
+        self.assertEqual(self.at24c.load(100, len(data)), data)
+        buffer = bytearray(len(data))
+        self.at24c.load_into(100, buffer)
+        self.assertEqual(buffer, data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from hackPyrateBus.W25Q64FV import W25Q64FV
+from hackPyrateBus.emulator import BusPirateEmulator, EmulatedPort, W25Q64FVModel, attach
+
+
+class TestErase(unittest.TestCase):
+
+    def setUp(self):
+        self.model = W25Q64FVModel(time_scale=0)
+        self.winbond = attach(W25Q64FV(connect=False), EmulatedPort(BusPirateEmulator(spi=self.model), timeout=1))
+        self.winbond.speed = '8MHz'
+
+    def tearDown(self):
+        self.assertEqual(self.model.violations, 0)
+
+    def test_erase_plan(self):
+        plan = self.winbond.erase_plan(0x00F000, 0x11000)
+        self.assertEqual(plan, [
+            (W25Q64FV.COMMAND_ERASE_SECTOR, 0x00F000),
+            (W25Q64FV.COMMAND_ERASE_64KB, 0x010000),
+        ])
+        plan = self.winbond.erase_plan(0x008000, 0x19000)
+        self.assertEqual(plan, [
+            (W25Q64FV.COMMAND_ERASE_32KB, 0x008000),
+            (W25Q64FV.COMMAND_ERASE_64KB, 0x010000),
+            (W25Q64FV.COMMAND_ERASE_SECTOR, 0x020000),
+        ])
+        self.assertEqual(self.winbond.erase_plan(0, W25Q64FV.MAX_WORDS), [(W25Q64FV.COMMAND_ERASE_CHIP, 0)])
+        with self.assertRaises(ValueError):
+            self.winbond.erase_plan(0x000100, 0x1000)
+        with self.assertRaises(ValueError):
+            self.winbond.erase_plan(W25Q64FV.MAX_WORDS - 0x1000, 0x2000)
+
+    def test_erase_range(self):
+        self.model.memory[0x00E000:0x022000] = b'\x00' * 0x14000
+        self.winbond.erase_range(0x00F000, 0x11000)
+        self.assertEqual(self.winbond.read(0x00F000, 0x11000), b'\xff' * 0x11000)
+        self.assertEqual(self.winbond.read(0x00E000, 0x1000), b'\x00' * 0x1000)
+        self.assertEqual(self.winbond.read(0x020000, 0x1000), b'\x00' * 0x1000)
+
+    def test_erase_time(self):
+        plan = self.winbond.erase_plan(0x000000, 0x20000)
+        self.assertEqual(self.winbond.erase_time(plan), (0.3, 4.0))
+        self.assertEqual(self.winbond.erase_range(0x000000, 0x20000, dry_run=True), plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import time
+import unittest
+
+from hackPyrateBus.W25Q64FV import W25Q64FV
+from hackPyrateBus.emulator import BusPirateEmulator, EmulatedPort, W25Q64FVModel, attach
+from hackPyrateBus.fleet import Fleet
+
+
+class EmulatedFleet(Fleet):
+    """ Fleet of emulated programmers, each one taking its own time to connect """
+
+    def __init__(self, delays):
+        super().__init__(W25Q64FV, ports=list(delays))
+        self.delays = delays
+        self.models = {port: W25Q64FVModel(size=0x10000, time_scale=0) for port in delays}
+
+    def connect(self, port):
+        if self.delays[port] is None:
+            raise IOError('Could not open %s' % port)
+        time.sleep(self.delays[port])
+        winbond = attach(W25Q64FV(connect=False), EmulatedPort(BusPirateEmulator(spi=self.models[port]), timeout=1))
+        winbond.speed = '8MHz'
+        return winbond
+
+
+def mark(winbond, item):
+    """ Job writing the item, or a marker, at the start of the flash """
+    winbond.store(0x000000, item or b'done')
+    return item
+
+
+class TestFleet(unittest.TestCase):
+
+    def test_every_programmer(self):
+        fleet = EmulatedFleet({'fast': 0.0, 'slow': 0.5})
+        results = fleet.run(mark)
+        self.assertEqual([result['port'] for result in results], ['fast', 'slow'])
+        self.assertEqual([result['error'] for result in results], [None, None])
+        for model in fleet.models.values():
+            self.assertEqual(model.memory[:4], b'done')
+
+    def test_connect_failure(self):
+        fleet = EmulatedFleet({'fast': 0.0, 'missing': None})
+        results = fleet.run(mark)
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual(results[1]['port'], 'missing')
+        self.assertIsInstance(results[1]['error'], IOError)
+
+    def test_items(self):
+        fleet = EmulatedFleet({'fast': 0.0, 'slow': 0.5})
+        items = [bytes([i]) * 4 for i in range(6)]
+        results = fleet.run(mark, items)
+        self.assertEqual([result['result'] for result in results], items)
+        self.assertEqual(sum(job['jobs'] for job in Fleet.summary(results).values()), 6)
+        # the fast programmer takes the jobs while the slow one connects
+        self.assertIn('fast', Fleet.summary(results))
+
+    def test_no_programmer(self):
+        fleet = EmulatedFleet({'missing': None})
+        results = fleet.run(mark, [b'a', b'b'])
+        self.assertEqual([result['port'] for result in results], [None, None])
+        self.assertIn('missing', str(results[0]['error']))
+
+
+if __name__ == '__main__':
+    unittest.main()
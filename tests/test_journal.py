@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+
+from hackPyrateBus import journal
+from hackPyrateBus.W25Q64FV import W25Q64FV
+from hackPyrateBus.emulator import BusPirateEmulator, EmulatedPort, W25Q64FVModel, attach
+from vendor.pyBusPirateLite.base import ProtocolError
+
+
+class Interrupted(Exception):
+    """ Stands for the job being killed """
+
+
+class TestJournal(unittest.TestCase):
+
+    SIZE = 8 * journal.DUMP_CHUNK
+
+    def setUp(self):
+        self.model = W25Q64FVModel(time_scale=0, image=os.urandom(self.SIZE))
+        self.winbond = attach(W25Q64FV(connect=False), EmulatedPort(BusPirateEmulator(spi=self.model), timeout=1))
+        self.winbond.speed = '8MHz'
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'flash.img')
+        self.calls = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def inject(self, name, failures):
+        """ Make the device method fail as listed, one entry per call: None
+        succeeds, an exception class is raised """
+        method = getattr(self.winbond, name)
+
+        def wrapper(addr, *args, **kwargs):
+            self.calls.append(addr)
+            error = failures.pop(0) if failures else None
+            if error is not None:
+                raise error('injected')
+            return method(addr, *args, **kwargs)
+
+        setattr(self.winbond, name, wrapper)
+
+    def test_resume_dump(self):
+        self.inject('read_into', [None, None, None, Interrupted])
+        with self.assertRaises(Interrupted):
+            journal.dump(self.winbond, self.path, amount=self.SIZE)
+        self.assertTrue(os.path.exists(self.path + '.journal'))
+
+        self.calls.clear()
+        stats = journal.dump(self.winbond, self.path, amount=self.SIZE)
+        self.assertEqual((stats['skipped'], stats['chunks'], stats['bytes']), (3, 5, 5 * journal.DUMP_CHUNK))
+        # only the missing chunks are read
+        self.assertEqual(self.calls, list(range(3 * journal.DUMP_CHUNK, self.SIZE, journal.DUMP_CHUNK)))
+        self.assertFalse(os.path.exists(self.path + '.journal'))
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.model.memory[:self.SIZE])
+
+    def test_resume_corrupted_chunk(self):
+        self.inject('read_into', [None, None, Interrupted])
+        with self.assertRaises(Interrupted):
+            journal.dump(self.winbond, self.path, amount=self.SIZE)
+        with open(self.path, 'r+b') as f:
+            f.write(b'\x00')
+
+        stats = journal.dump(self.winbond, self.path, amount=self.SIZE)
+        self.assertEqual((stats['skipped'], stats['chunks']), (1, 7))
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.model.memory[:self.SIZE])
+
+    def test_retry(self):
+        self.inject('read_into', [None, ProtocolError, ProtocolError])
+        stats = journal.dump(self.winbond, self.path, amount=self.SIZE)
+        self.assertEqual((stats['chunks'], stats['retries']), (8, 2))
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), self.model.memory[:self.SIZE])
+
+    def test_retries_exhausted(self):
+        self.inject('read_into', [None] + [ProtocolError] * 3)
+        with self.assertRaises(ProtocolError):
+            journal.dump(self.winbond, self.path, amount=self.SIZE, retries=2)
+        # the completed chunk is kept for the next run
+        self.assertEqual(journal.dump(self.winbond, self.path, amount=self.SIZE)['skipped'], 1)
+
+    def test_program_skip(self):
+        image = bytearray(os.urandom(4 * W25Q64FV.SECTOR_SIZE))
+        with open(self.path, 'wb') as f:
+            f.write(image)
+
+        self.inject('update', [None, None, None, Interrupted])
+        with self.assertRaises(Interrupted):
+            journal.program(self.winbond, self.path)
+
+        # the second chunk changed in the image since it was programmed
+        image[W25Q64FV.SECTOR_SIZE] ^= 0xFF
+        with open(self.path, 'wb') as f:
+            f.write(image)
+
+        self.calls.clear()
+        stats = journal.program(self.winbond, self.path)
+        self.assertEqual((stats['skipped'], stats['chunks']), (2, 2))
+        self.assertEqual(self.calls, [W25Q64FV.SECTOR_SIZE, 3 * W25Q64FV.SECTOR_SIZE])
+        self.assertEqual(self.model.memory[:len(image)], image)
+
+
+if __name__ == '__main__':
+    unittest.main()
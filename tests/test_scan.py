@@ -0,0 +1,26 @@
+import unittest
+
+from hackPyrateBus.emulator import AT24CXXXModel, BusPirateEmulator, EmulatedPort, attach
+from vendor.pyBusPirateLite.I2C import I2C
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        emulator = BusPirateEmulator(i2c=[AT24CXXXModel(), AT24CXXXModel(device_address=0x57)])
+        self.i2c = attach(I2C(connect=False), EmulatedPort(emulator, timeout=1))
+
+    def test_scan(self):
+        self.assertEqual(self.i2c.scan(), [0x50, 0x57])
+
+    def test_read(self):
+        self.assertEqual(self.i2c.scan(write=False, read=True), [0x50, 0x57])
+        self.assertEqual(self.i2c.scan(addresses=range(0x51, 0x57)), [])
+
+    def test_batch(self):
+        self.assertEqual(self.i2c.scan(batch=16), self.i2c.scan())
+        self.assertEqual(self.i2c.scan(read=True, batch=5), [0x50, 0x57])
+
+
+if __name__ == '__main__':
+    unittest.main()
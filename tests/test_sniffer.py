@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from hackPyrateBus.emulator import BusPirateEmulator, EmulatedPort, W25Q64FVModel, attach
+from vendor.pyBusPirateLite.SPI import SPI
+from vendor.pyBusPirateLite.sniffer import I2CDecoder, SPIDecoder, decode_capture
+
+
+def escape_i2c(values):
+    """ I2C sniffer encoding of ACKed bytes """
+    return b''.join(b'\\' + bytes([value]) + b'+' for value in values)
+
+
+class TestDecoders(unittest.TestCase):
+
+    I2C_STREAM = (b'[' + escape_i2c([0xa0, 0x00, 0x10]) + b'[' + b'\\\xa1+\\\x5b+\\\x5d-]' +
+                  b'[\\\x42-]')
+    SPI_STREAM = b'[\\\x9f\x00\\\x00\xef\\\x00\x40]'
+
+    def test_i2c(self):
+        transactions = I2CDecoder().feed(self.I2C_STREAM)
+        self.assertEqual(len(transactions), 3)
+        write, read, nack = transactions
+        self.assertEqual((write['address'], write['read'], write['data'], write['stop']), (0x50, False, b'\x00\x10', False))
+        self.assertEqual((read['address'], read['read'], read['restart']), (0x50, True, True))
+        self.assertEqual((read['data'], read['acks']), (b'\x5b\x5d', [True, False]))
+        self.assertEqual((nack['address'], nack['ack']), (0x21, False))
+
+    def test_i2c_split(self):
+        decoder = I2CDecoder()
+        transactions = []
+        for value in self.I2C_STREAM:
+            transactions += decoder.feed(bytes([value]))
+        self.assertEqual(transactions, I2CDecoder().feed(self.I2C_STREAM))
+
+    def test_spi(self):
+        transactions = SPIDecoder().feed(self.SPI_STREAM)
+        self.assertEqual(transactions, [{'mosi': b'\x9f\x00\x00', 'miso': b'\x00\xef\x40', 'cs': True}])
+
+    def test_sniffer(self):
+        spi = attach(SPI(connect=False), EmulatedPort(BusPirateEmulator(spi=W25Q64FVModel()), timeout=0.1))
+        with tempfile.TemporaryDirectory() as directory:
+            capture = os.path.join(directory, 'spi.cap')
+            with spi.sniff(capture=capture) as sniffer:
+                pass
+            self.assertEqual(list(sniffer.transactions()), [])
+            self.assertEqual(decode_capture(capture), [])
+        # the Bus Pirate is back in SPI mode
+        self.assertEqual(spi.transfer([0x9f, 0x00])[1:], b'\xef')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import unittest
+
+from hackPyrateBus.W25Q64FV import W25Q64FV
+from hackPyrateBus.emulator import BusPirateEmulator, EmulatedPort, W25Q64FVModel, attach
+
+
+class TestUpdate(unittest.TestCase):
+
+    def setUp(self):
+        self.model = W25Q64FVModel(time_scale=0)
+        self.winbond = attach(W25Q64FV(connect=False), EmulatedPort(BusPirateEmulator(spi=self.model), timeout=1))
+        self.winbond.speed = '8MHz'
+
+    def tearDown(self):
+        self.assertEqual(self.model.violations, 0)
+
+    def test_update(self):
+        image = bytearray(os.urandom(4 * W25Q64FV.SECTOR_SIZE))
+        result = self.winbond.update(0x010000, image)
+        self.assertEqual(result['erased'], [])
+        self.assertEqual(result['pages'], 64)
+
+        # unchanged
+        result = self.winbond.update(0x010000, image)
+        self.assertEqual((result['erased'], result['pages']), ([], 0))
+
+        # bits cleared only, no erase
+        image[0x100:0x110] = b'\x00' * 16
+        result = self.winbond.update(0x010000, image)
+        self.assertEqual((result['erased'], result['pages']), ([], 1))
+
+        # bits set, the sector is erased and the rest of it preserved
+        image[0x2100:0x2110] = b'\xff' * 16
+        result = self.winbond.update(0x010000, image)
+        self.assertEqual(result['erased'], [0x012000])
+        self.assertEqual(self.winbond.read(0x010000, len(image)), image)
+
+        # partial sector, the bytes outside the range are preserved
+        self.winbond.update(0x010800, b'hello')
+        image[0x800:0x805] = b'hello'
+        self.assertEqual(self.winbond.read(0x010000, len(image)), image)
+
+    def test_contiguous_pages(self):
+        image = bytearray(os.urandom(4 * W25Q64FV.SECTOR_SIZE))
+        self.winbond.update(0x010000, image)
+
+        # pages across a sector boundary are programmed with a single store
+        image[0x0F00:0x1100] = b'\x00' * 0x200
+        image[0x3000:0x3001] = b'\x00'
+        stores = []
+        store = self.winbond.store
+        self.winbond.store = lambda addr, data: (stores.append((addr, len(data))), store(addr, data))
+        result = self.winbond.update(0x010000, image)
+        self.assertEqual(result['pages'], 3)
+        self.assertEqual(stores, [(0x010F00, 0x200), (0x013000, 0x100)])
+        self.assertEqual(self.winbond.read(0x010000, len(image)), image)
+
+
+if __name__ == '__main__':
+    unittest.main()